@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+"""Benchmarks for the core sync paths of ``importtools``.
+
+Every benchmark runs in a fresh process on deterministic synthetic data and
+reports its wall time and memory usage as one JSON object per line, so
+results from different commits can be stored and compared::
+
+    python benchmarks/bench.py -n 10000 -n 100000 -o before.jsonl
+    git checkout other-branch
+    python benchmarks/bench.py -n 10000 -n 100000 -o after.jsonl
+    python benchmarks/bench.py --compare before.jsonl after.jsonl
+
+"""
+
+import Queue
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from importtools import (
+    Importable, RecordingDataSet, SimpleDataSet,
+    chunked_loader, chunked_mem_sync,
+)
+
+
+class BenchImportable(Importable):
+    __content_attrs__ = ['title', 'views', 'flag']
+
+
+def make_records(n, change=0.01, add=0.01, remove=0.01, seed=0):
+    """Generate the content of a source and a destination of *n* records.
+
+    The destination holds *n* records and the source is built from it by
+    changing, adding and removing the given ratios of records. Both lists
+    are ordered by natural key and contain ``(natural_key, content)`` tuples
+    so the benchmarks can build fresh elements for every run.
+
+    """
+    rnd = random.Random(seed)
+    destination = []
+    source = []
+    # Natural keys are spaced out so added records can be put in between.
+    for i in xrange(n):
+        natural_key = (i * 2, 'key-%d' % i)
+        content = {
+            'title': 'title %d' % rnd.randint(0, n),
+            'views': rnd.randint(0, 10 ** 6),
+            'flag': rnd.random() < 0.5,
+        }
+        destination.append((natural_key, content))
+        draw = rnd.random()
+        if draw < remove:
+            continue
+        if draw < remove + change:
+            content = dict(content, views=content['views'] + 1)
+        source.append((natural_key, content))
+        if rnd.random() < add:
+            source.append(((i * 2 + 1, 'new-%d' % i), {
+                'title': 'new %d' % i, 'views': 0, 'flag': False,
+            }))
+    return source, destination
+
+
+def build(records):
+    return [BenchImportable(k, **c) for k, c in records]
+
+
+def bench_importable_init(source, destination, args):
+    def run():
+        build(destination)
+    return run
+
+
+def bench_importable_update(source, destination, args):
+    elements = build(destination)
+    content = [c for k, c in source]
+
+    def run():
+        for element, c in zip(elements, content):
+            element.update(**c)
+    return run
+
+
+def bench_simple_sync(source, destination, args):
+    src, dst = build(source), build(destination)
+
+    def run():
+        SimpleDataSet(dst).sync(src)
+    return run
+
+
+def bench_recording_sync(source, destination, args):
+    src, dst = build(source), build(destination)
+
+    def run():
+        RecordingDataSet(dst).sync(src)
+    return run
+
+
+def bench_recording_add_pop_reset(source, destination, args):
+    src, dst = build(source), build(destination)
+
+    def run():
+        rds = RecordingDataSet(dst)
+        for element in src:
+            rds.add(element)
+        rds.reset()
+        for element in dst[::2]:
+            rds.pop(element)
+        rds.reset()
+    return run
+
+
+def bench_chunked_loader(source, destination, args):
+    src, dst = build(source), build(destination)
+
+    def run():
+        for chunk in chunked_loader(src, dst, args.hint):
+            pass
+    return run
+
+
+def bench_chunked_mem_sync(source, destination, args):
+    src, dst = build(source), build(destination)
+
+    def run():
+        for ds in chunked_mem_sync(src, dst, hint=args.hint):
+            pass
+    return run
+
+
+def bench_chunked_mem_sync_pool(source, destination, args):
+    src, dst = build(source), build(destination)
+    pool = multiprocessing.Pool(args.workers)
+
+    def run():
+        for ds in chunked_mem_sync(src, dst, hint=args.hint, pool=pool):
+            pass
+        pool.close()
+        pool.join()
+    return run
+
+
+BENCHMARKS = dict(
+    (name[len('bench_'):], f) for name, f in globals().items()
+    if name.startswith('bench_')
+)
+
+
+def _maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_one(name, n, args, queue):
+    source, destination = make_records(
+        n, args.change, args.add, args.remove, args.seed
+    )
+    run = BENCHMARKS[name](source, destination, args)
+    gc.collect()
+    rss_before = _maxrss()
+    start = time.time()
+    run()
+    seconds = time.time() - start
+    queue.put({
+        'seconds': seconds,
+        'maxrss_kb': _maxrss(),
+        'delta_maxrss_kb': _maxrss() - rss_before,
+    })
+
+
+def run_benchmark(name, n, args):
+    """Run a benchmark in a fresh process and return the best result.
+
+    If the process dies without a result, for example running out of memory,
+    a result with an ``error`` and no ``seconds`` is returned instead.
+
+    """
+    best = None
+    for repeat in range(args.repeat):
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(
+            target=_run_one, args=(name, n, args, queue)
+        )
+        p.start()
+        result = None
+        while result is None:
+            try:
+                result = queue.get(timeout=1)
+            except Queue.Empty:
+                if p.is_alive():
+                    continue
+                # The result may have been sent right before exiting.
+                try:
+                    result = queue.get(timeout=1)
+                except Queue.Empty:
+                    break
+        p.join()
+        if result is None:
+            return {
+                'seconds': None,
+                'error': 'benchmark process exited with code %s' % p.exitcode,
+            }
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    out = open(args.output, 'a') if args.output else sys.stdout
+    commit = _commit()
+    names = args.benchmark or sorted(BENCHMARKS)
+    for n in args.records or [10 ** 4]:
+        for name in names:
+            result = run_benchmark(name, n, args)
+            result.update({
+                'benchmark': name,
+                'records': n,
+                'change': args.change,
+                'add': args.add,
+                'remove': args.remove,
+                'seed': args.seed,
+                'commit': commit,
+                'python': sys.version.split()[0],
+                'timestamp': time.time(),
+            })
+            out.write(json.dumps(result, sort_keys=True) + '\n')
+            out.flush()
+    if out is not sys.stdout:
+        out.close()
+
+
+def _load(path):
+    results = {}
+    with open(path) as f:
+        for line in f:
+            r = json.loads(line)
+            results[r['benchmark'], r['records']] = r
+    return results
+
+
+def compare(old_path, new_path):
+    old, new = _load(old_path), _load(new_path)
+    print '%-28s %10s %10s %10s %8s' % (
+        'benchmark', 'records', 'old (s)', 'new (s)', 'ratio'
+    )
+    for key in sorted(set(old) & set(new)):
+        o, n = old[key]['seconds'], new[key]['seconds']
+        if o is None or n is None:
+            print '%-28s %10d %10s %10s %8s' % (key + (
+                'failed' if o is None else '%.3f' % o,
+                'failed' if n is None else '%.3f' % n, '-',
+            ))
+            continue
+        print '%-28s %10d %10.3f %10.3f %8.2f' % (
+            key + (o, n, n / o if o else float('inf'))
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '-n', '--records', type=int, action='append',
+        help='number of destination records, can be repeated '
+             '(default: 10000)',
+    )
+    parser.add_argument(
+        '-b', '--benchmark', action='append', choices=sorted(BENCHMARKS),
+        help='benchmark to run, can be repeated (default: all)',
+    )
+    parser.add_argument('--change', type=float, default=0.01)
+    parser.add_argument('--add', type=float, default=0.01)
+    parser.add_argument('--remove', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hint', type=int, default=16384)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--workers', type=int, default=multiprocessing.cpu_count(),
+        help='worker processes of the pool benchmarks (default: CPU count)',
+    )
+    parser.add_argument(
+        '-o', '--output', help='append JSON lines to this file',
+    )
+    parser.add_argument(
+        '--compare', nargs=2, metavar=('OLD', 'NEW'),
+        help='compare two result files instead of running benchmarks',
+    )
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
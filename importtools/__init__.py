@@ -1,8 +1,21 @@
+import collections
+import cPickle as pickle
+import hashlib
 import heapq
 import itertools
+import marshal
+import operator
+import time
 
 from importtools.importables import *
 from importtools.datasets import *
+from importtools.checkpoints import *
+from importtools.instrumentation import *
+from importtools.threads import *
+from importtools.sorting import *
+from importtools.snapshots import *
+from importtools.importables import _dumps
+from importtools.sorting import _read_run, _spill_partitions
 
 try:
     from importtools.dj import *
@@ -11,16 +24,627 @@ except ImportError:
 
 
 def chunked_mem_sync(source_loader, destination_loader,
-                     DSFactory=RecordingDataSet, hint=16384):
-    """A shortcut for chunked imports."""
-    l = chunked_loader(source_loader, destination_loader, hint)
-    for source, destination in l:
-        dest_ds = DSFactory(destination)
-        dest_ds.sync(source)
+                     DSFactory=RecordingDataSet, hint=16384,
+                     pool=None, max_pending=16, instrumentation=None,
+                     read_ahead=0):
+    """A shortcut for chunked imports.
+
+    Because equal elements are never split across chunks, every chunk can be
+    synced independently. If a ``multiprocessing.Pool`` is passed as *pool*
+    the chunks are synced by its worker processes while the datasets are
+    still yielded in the loading order. At most *max_pending* chunks are
+    waiting in the pool at any time, so memory usage stays bounded. Only the
+    natural keys and the content of the elements are sent to the workers and
+    only the differences they find come back, so the elements themselves
+    stay in this process, along with their listeners. The differences are
+    then replayed on a *DSFactory* dataset of the destination elements. In
+    this mode the element classes and *DSFactory* must be picklable.
+
+    The progress of the import can be observed by passing a
+    :py:class:`SyncInstrumentation` as *instrumentation*. For *read_ahead*
+    see :py:func:`chunked_loader`.
+
+    >>> import multiprocessing
+    >>> from importtools import Importable
+    >>> source = [Importable(i) for i in range(0, 10, 2)]
+    >>> destination = [Importable(i) for i in range(0, 10, 3)]
+    >>> pool = multiprocessing.Pool(2)
+    >>> for ds in chunked_mem_sync(source, destination, hint=4, pool=pool):
+    ...     print sorted(ds.added), sorted(ds.removed)
+    [Importable(2)] [Importable(3)]
+    [Importable(4), Importable(8)] []
+    [] [Importable(9)]
+    >>> pool.close()
+    >>> pool.join()
+
+    A dataset and its elements are freed as soon as the consumer drops it and
+    moves on to the next chunk, without waiting for the garbage collector:
+
+    >>> import gc, weakref
+    >>> gc.disable()
+    >>> chunks = chunked_mem_sync(source, destination, hint=4)
+    >>> ref = weakref.ref(next(chunks))
+    >>> ds = next(chunks)
+    >>> ref() is None
+    True
+    >>> gc.enable()
+
+    """
+    l = chunked_loader(source_loader, destination_loader, hint, read_ahead)
+    return _mem_sync_chunks(l, DSFactory, pool, max_pending, instrumentation)
+
+
+def resumable_mem_sync(source_loader, destination_loader, checkpoint,
+                       DSFactory=RecordingDataSet, hint=16384,
+                       pool=None, max_pending=16, instrumentation=None,
+                       read_ahead=0):
+    """A chunked import that can resume after a failure.
+
+    This works like :py:func:`chunked_mem_sync` but records a *checkpoint*,
+    for example a :py:class:`FileCheckpoint`, with the last natural key of
+    each chunk once the consumer is done with it and asks for the next one.
+    The consumer should persist each dataset before moving on. When a
+    checkpoint exists, the import resumes after its natural key. The
+    checkpoint is cleared once all the chunks are done.
+
+    The loaders can be callables taking the natural key to resume after, or
+    ``None``, and returning the ordered elements after it. This way they can
+    seek instead of loading the finished part again. Elements up to the
+    checkpoint are skipped in any case, so plain ordered iterables work too:
+
+    >>> import os, tempfile
+    >>> from importtools import Importable
+    >>> path = os.path.join(tempfile.mkdtemp(), 'import.checkpoint')
+    >>> checkpoint = FileCheckpoint(path)
+    >>> source = [Importable(i) for i in range(0, 10, 2)]
+    >>> destination = lambda after: [Importable(i) for i in range(0, 10, 3)
+    ...                              if after is None or i > after]
+
+    >>> run = resumable_mem_sync(source, destination, checkpoint, hint=4)
+    >>> sorted(next(run).added)
+    [Importable(2)]
+    >>> sorted(next(run).added)
+    [Importable(4), Importable(8)]
+    >>> checkpoint.load()['natural_key']
+    3
+
+    If the run is interrupted here, the next one starts with the second
+    chunk again:
+
+    >>> run = resumable_mem_sync(source, destination, checkpoint, hint=4)
+    >>> [sorted(ds.added) for ds in run]
+    [[Importable(4), Importable(8)], []]
+    >>> checkpoint.load() is None
+    True
+
+    """
+    state = checkpoint.load()
+    after = state['natural_key'] if state is not None else None
+    chunk_count = state.get('chunks', 0) if state is not None else 0
+
+    source = _resume_after(source_loader, after)
+    destination = _resume_after(destination_loader, after)
+    last_keys = collections.deque()
+    chunks = _record_last_keys(
+        chunked_loader(source, destination, hint, read_ahead), last_keys
+    )
+    synced = _mem_sync_chunks(
+        chunks, DSFactory, pool, max_pending, instrumentation
+    )
+    for dest_ds in synced:
+        yield dest_ds
+        del dest_ds
+        chunk_count += 1
+        checkpoint.save(last_keys.popleft(), chunks=chunk_count)
+    checkpoint.clear()
+
+
+def _resume_after(loader, natural_key):
+    if callable(loader):
+        loader = loader(natural_key)
+    if natural_key is None:
+        return loader
+    return itertools.dropwhile(lambda e: e.natural_key <= natural_key, loader)
+
+
+def _record_last_keys(chunks, last_keys):
+    for source, destination in chunks:
+        last = [l[-1] for l in (source, destination) if l]
+        last_keys.append(max(last).natural_key)
+        yield source, destination
+
+
+def partitioned_mem_sync(source_loader, destination_loader, partitions=16,
+                         DSFactory=RecordingDataSet, pool=None, max_pending=16,
+                         instrumentation=None, tempdir=None):
+    """A bucketed import for sources that are not ordered.
+
+    Both sides are read once and spilled to *partitions* temporary files in
+    *tempdir* by the hash of their elements, so equal elements always end up
+    in the same bucket. The buckets are then synced one by one, exactly like
+    the chunks of :py:func:`chunked_mem_sync`, including the *pool*,
+    *max_pending* and *instrumentation* options. Memory usage is bounded by
+    the largest bucket instead of the whole dataset and nothing needs to be
+    sorted. The elements must be picklable:
+
+    >>> from importtools import Importable
+    >>> source = [Importable(i) for i in (5, 3, 8, 1)]
+    >>> destination = [Importable(i) for i in (9, 0, 3, 6)]
+    >>> for ds in partitioned_mem_sync(source, destination, partitions=2):
+    ...     print sorted(ds.added), sorted(ds.removed)
+    [Importable(8)] [Importable(0), Importable(6)]
+    [Importable(1), Importable(5)] [Importable(9)]
+
+    The datasets are yielded in bucket order and buckets empty on both sides
+    are skipped. Listeners and trackers registered on the elements are not
+    kept, just like when pickling them.
+
+    """
+    partitions = int(partitions)
+    if partitions <= 0:
+        raise ValueError('The number of partitions must be positive.')
+    source = _spill_partitions(source_loader, partitions, tempdir)
+    try:
+        destination = _spill_partitions(
+            destination_loader, partitions, tempdir
+        )
+    except:
+        for f in source:
+            f.close()
+        raise
+    buckets = _read_buckets(zip(source, destination))
+    return _mem_sync_chunks(
+        buckets, DSFactory, pool, max_pending, instrumentation
+    )
+
+
+def _read_buckets(files):
+    try:
+        for source, destination in files:
+            bucket = list(_read_run(source)), list(_read_run(destination))
+            source.close()
+            destination.close()
+            if bucket[0] or bucket[1]:
+                yield bucket
+            del bucket
+    finally:
+        for source, destination in files:
+            source.close()
+            destination.close()
+
+
+def digest_mem_sync(source_loader, destination_loader, digests,
+                    DSFactory=RecordingDataSet, hint=16384,
+                    instrumentation=None):
+    """A chunked import that skips the natural key ranges that didn't change.
+
+    The ordered source is split in natural key ranges and a digest of the
+    elements in each range is compared to the one stored in *digests*, for
+    example a :py:class:`FileRangeDigests`, by the previous run. Only the
+    ranges with a different digest are loaded from the destination and
+    synced, so when little changes the destination I/O and the diffing
+    work are proportional to the amount of change rather than to the total
+    size. The source is still read in full to compute its digests, but at
+    most about ``2 * hint`` of its elements are held in memory at a time.
+
+    *destination_loader* is called with the ``(lower, upper)`` natural keys
+    of a range, either can be ``None`` for an unbounded side, and must return
+    the ordered destination elements with natural keys greater than *lower*
+    and up to *upper*. The elements must provide a ``digest`` like
+    ``Importable`` does.
+
+    Changed ranges are synced in chunks, exactly like
+    :py:func:`chunked_mem_sync`, and the chunk boundaries become the range
+    boundaries of the next run. The chunks of all the changed ranges are
+    reported to the *instrumentation*, if one is given. On the first run, when no digests are
+    stored, everything is synced:
+
+    >>> import os, tempfile
+    >>> from importtools import Importable
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a']
+    >>> store = dict((i, MockImportable(i, a=i)) for i in range(10))
+    >>> loaded = []
+    >>> def destination(lower, upper):
+    ...     loaded.append((lower, upper))
+    ...     return [store[k] for k in sorted(store)
+    ...             if (lower is None or k > lower)
+    ...             and (upper is None or k <= upper)]
+    >>> def source(changes):
+    ...     return [MockImportable(i, a=changes.get(i, i)) for i in range(10)]
+    >>> path = os.path.join(tempfile.mkdtemp(), 'import.digests')
+    >>> digests = FileRangeDigests(path)
+
+    >>> for ds in digest_mem_sync(source({}), destination, digests, hint=8):
+    ...     pass
+    >>> loaded
+    [(None, None)]
+    >>> [upper for upper, digest in digests.load()]
+    [3, 7, None]
+
+    Afterwards only the ranges with changes are loaded and synced:
+
+    >>> loaded = []
+    >>> for ds in digest_mem_sync(source({5: 50}), destination, digests,
+    ...                           hint=8):
+    ...     print sorted(ds.changed)
+    [MockImportable(5, a=50)]
+    >>> loaded
+    [(3, 7)]
+    >>> loaded = []
+    >>> list(digest_mem_sync(source({5: 50}), destination, digests, hint=8))
+    []
+    >>> loaded
+    []
+
+    Ranges without a stored digest are streamed chunk by chunk instead of
+    being read in full first, so a full sync runs in bounded memory too:
+
+    >>> read = []
+    >>> def reading(elements):
+    ...     for element in elements:
+    ...         read.append(element)
+    ...         yield element
+    >>> digests.clear()
+    >>> run = digest_mem_sync(reading(source({})), destination, digests,
+    ...                       hint=8)
+    >>> ds = next(run)
+    >>> len(read)
+    6
+    >>> ds = list(run)
+
+    The stored digests describe the destination as left by the previous run,
+    so the consumer must persist every dataset and the destination must not
+    be changed by anything else between runs. Clear the digests to force a
+    full sync. The new digests are saved only after all the ranges are done,
+    an interrupted run leaves the previous ones in place.
+
+    """
+    new_ranges = []
+    chunks = _changed_range_chunks(
+        source_loader, destination_loader, digests.load() or [(None, None)],
+        hint, new_ranges,
+    )
+    synced = _mem_sync_chunks(
+        chunks, DSFactory, instrumentation=instrumentation
+    )
+    for dest_ds in synced:
         yield dest_ds
+        del dest_ds
+    digests.save(new_ranges)
+
+
+def _changed_range_chunks(source_loader, destination_loader, ranges, hint,
+                          new_ranges):
+    """Yield the chunks of the changed ranges and record the new ranges."""
+    sentinel = object()
+    source = iter(source_loader)
+    pending = [next(source, sentinel)]
+    # Ranges are made of single chunks, so an unchanged range never holds
+    # much more than *hint* source elements.
+    max_buffer = 2 * hint
+    lower = None
+    for upper, digest in ranges:
+        elements = _source_range(source, pending, upper, sentinel)
+        if digest is not None:
+            buffered = list(itertools.islice(elements, max_buffer + 1))
+            if len(buffered) > max_buffer:
+                elements = itertools.chain(buffered, elements)
+            elif _range_digest(buffered) == digest:
+                new_ranges.append((upper, digest))
+                lower = upper
+                continue
+            else:
+                elements = buffered
+            del buffered
+        # Ranges without a digest are streamed, the chunk digests are
+        # computed as the chunks are loaded.
+        chunks = chunked_loader(
+            elements, destination_loader(lower, upper), hint
+        )
+        del elements
+        synced = []
+        for chunk in chunks:
+            last = max(l[-1] for l in chunk if l)
+            synced.append((last.natural_key, _range_digest(chunk[0])))
+            del last
+            yield chunk
+            del chunk
+        # The last chunk extends up to the end of the range. Ranges that
+        # became empty are merged into the next one, except the last.
+        if synced:
+            synced[-1] = (upper, synced[-1][1])
+        elif upper is None:
+            synced.append((None, _range_digest(())))
+        new_ranges.extend(synced)
+        lower = upper
+
+
+def _source_range(source, pending, upper, sentinel):
+    """Yield the source elements up to *upper*, *pending* holds the next."""
+    while True:
+        s = pending[0]
+        if s is sentinel or (upper is not None and s.natural_key > upper):
+            return
+        pending[0] = next(source, sentinel)
+        yield s
+
+
+def _range_digest(elements):
+    digest = hashlib.sha1()
+    for element in elements:
+        digest.update(_dumps(element.natural_key))
+        digest.update('\0')
+        digest.update(element.digest)
+        digest.update('\0')
+    return digest.hexdigest()
+
+
+def _mem_sync_chunks(chunks, DSFactory, pool=None, max_pending=16,
+                     instrumentation=None):
+    clock = time.time
+    synced = _synced_chunks(chunks, DSFactory, pool, max_pending)
+    try:
+        for index, (dest_ds, stats) in enumerate(synced):
+            if instrumentation is not None:
+                stats['chunk'] = index
+                summary = stats.pop('summary')
+                for name in ('added', 'removed', 'changed'):
+                    if isinstance(summary, SyncSummary):
+                        stats[name] = getattr(summary, name)
+                    else:
+                        stats[name] = sum(
+                            1 for e in getattr(dest_ds, name, ())
+                        )
+            start = clock()
+            yield dest_ds
+            # Don't hold any references while the next chunk is loaded, so the
+            # memory of the current one is freed once the consumer drops it.
+            del dest_ds
+            if instrumentation is not None:
+                stats['yield_time'] = clock() - start
+                instrumentation.chunk_synced(stats)
+    finally:
+        if instrumentation is not None:
+            instrumentation.finished()
+
+
+def _synced_chunks(chunks, DSFactory, pool, max_pending):
+    """Sync the chunks and yield the datasets along with their statistics."""
+    clock = time.time
+    chunks = iter(chunks)
+    pending = collections.deque()
+    max_pending = max(int(max_pending), 1)
+    while True:
+        start = clock()
+        try:
+            source, destination = next(chunks)
+        except StopIteration:
+            break
+        stats = {
+            'source': len(source),
+            'destination': len(destination),
+            'load_time': clock() - start,
+        }
+        if pool is None:
+            start = clock()
+            dest_ds, stats['summary'] = _sync_chunk(
+                DSFactory, source, destination
+            )
+            stats['diff_time'] = clock() - start
+            del source, destination
+            yield dest_ds, stats
+            del dest_ds
+            continue
+        # Only compact rows are sent to the workers and only the positions
+        # of the differences come back, the elements stay in this process.
+        result = pool.apply_async(
+            _sync_packed, (DSFactory, _pack(source), _pack(destination))
+        )
+        pending.append((result, DSFactory, source, destination, stats))
+        del source, destination
+        if len(pending) >= max_pending:
+            yield _wait(*pending.popleft())
+    while pending:
+        yield _wait(*pending.popleft())
+
+
+def _wait(result, DSFactory, source, destination, stats):
+    start = time.time()
+    diff, stats['summary'] = result.get()
+    if isinstance(diff, tuple):
+        dest_ds = _apply_diff(DSFactory, source, destination, diff)
+    else:
+        # The dataset doesn't record its changes so it was sent back whole.
+        dest_ds = diff
+    stats['diff_time'] = time.time() - start
+    return dest_ds, stats
+
+
+def _sync_chunk(DSFactory, source, destination):
+    """Return the synced dataset along with the result of its ``sync``."""
+    dest_ds = DSFactory(destination)
+    summary = dest_ds.sync(source)
+    return dest_ds, summary
+
+
+def _pack(elements):
+    """Return the natural keys and the content of *elements* as plain data.
+
+    Each element becomes a row with its natural key, its digest and its
+    content values. The rows are encoded with ``marshal``, which is much
+    faster than pickling the elements, falling back to ``pickle`` for values
+    it can't encode. The rows are only used for classes with a generated
+    ``__init__``, which is known to take the content as keyword arguments,
+    other elements are pickled as they are.
+
+    """
+    if not elements:
+        return None
+    cls = type(elements[0])
+    generated = getattr(cls.__dict__.get('__init__'), '_generated', False)
+    if not generated or len(set(map(type, elements))) > 1:
+        return pickle.dumps(elements, pickle.HIGHEST_PROTOCOL)
+    attrs = sorted(cls._content_attrs)
+    try:
+        rows = map(operator.attrgetter('_natural_key', '_digest', *attrs),
+                   elements)
+    except AttributeError:
+        # Elements without some content attributes are sent as lists with
+        # the content by name.
+        rows = []
+        for element in elements:
+            content = {}
+            for attr in attrs:
+                if hasattr(element, attr):
+                    content[attr] = getattr(element, attr)
+            natural_key = element.natural_key
+            digest = getattr(element, '_digest', None)
+            if len(content) == len(attrs):
+                rows.append((natural_key, digest) + tuple(
+                    content[attr] for attr in attrs
+                ))
+            else:
+                rows.append([natural_key, digest, content])
+    try:
+        return cls, attrs, marshal.dumps(rows), True
+    except ValueError:
+        return cls, attrs, pickle.dumps(rows, pickle.HIGHEST_PROTOCOL), False
+
+
+def _unpack(packed):
+    if packed is None:
+        return []
+    if isinstance(packed, str):
+        return pickle.loads(packed)
+    cls, attrs, data, marshaled = packed
+    elements = []
+    append = elements.append
+    izip = itertools.izip
+    for row in (marshal if marshaled else pickle).loads(data):
+        if isinstance(row, list):
+            natural_key, digest, content = row
+        else:
+            natural_key, digest = row[0], row[1]
+            content = dict(izip(attrs, row[2:]))
+        if digest is not None:
+            content['digest'] = digest
+        append(cls(natural_key, **content))
+    return elements
+
 
+def _sync_packed(DSFactory, source, destination):
+    """Sync a packed chunk and return the positions of the differences.
 
-def chunked_loader(ordered_iter1, ordered_iter2, chunk_hint=16384):
+    The differences hold the positions of the added source elements, of the
+    removed destination elements and of the source elements that changed
+    a destination element. Datasets that don't record their changes are
+    returned as they are instead. Either is returned along with the result
+    of the dataset ``sync``.
+
+    """
+    source, destination = _unpack(source), _unpack(destination)
+    dest_ds, summary = _sync_chunk(DSFactory, source, destination)
+    try:
+        added, removed = dest_ds.added, dest_ds.removed
+        changed = dest_ds.changed
+    except AttributeError:
+        return dest_ds, summary
+    source_positions = dict(itertools.izip(source, itertools.count()))
+    destination_positions = dict(
+        itertools.izip(destination, itertools.count())
+    )
+    diff = (
+        [source_positions[e] for e in added],
+        [destination_positions[e] for e in removed],
+        [source_positions[e] for e in changed],
+    )
+    return diff, summary
+
+
+def _apply_diff(DSFactory, source, destination, diff):
+    """Replay the differences found by a worker on a new dataset."""
+    added, removed, changed = diff
+    dest_ds = DSFactory(destination)
+    record_sync = getattr(dest_ds, '_record_sync', None)
+    with batched_notifications():
+        for position in changed:
+            element = source[position]
+            existing = dest_ds.get(element)
+            changed_attrs = existing.sync(element)
+            if (isinstance(changed_attrs, (set, frozenset))
+                    and changed_attrs and record_sync is not None):
+                record_sync(existing, changed_attrs)
+        for position in added:
+            dest_ds.add(source[position])
+    for position in removed:
+        dest_ds.pop(destination[position])
+    return dest_ds
+
+
+def merge_sync(ordered_source, ordered_destination):
+    """Sync two ordered iterables in a single pass yielding the differences.
+
+    This is a streaming alternative to syncing a :py:class:`DataSet` that
+    works in constant memory. Both iterables must be sorted by their natural
+    keys. The elements are walked side by side in a merge-join fashion and
+    for every difference found a ``(status, element)`` tuple is yielded where
+    *status* is one of ``'added'``, ``'removed'`` or ``'changed'``:
+
+    >>> from importtools import Importable
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a']
+
+    >>> source = [MockImportable(1, a=1), MockImportable(2, a=20),
+    ...           MockImportable(4, a=4)]
+    >>> destination = [MockImportable(0, a=0), MockImportable(1, a=1),
+    ...                MockImportable(2, a=2), MockImportable(3, a=3)]
+    >>> for status, element in merge_sync(source, destination):
+    ...     print status, element
+    removed MockImportable(0, a=0)
+    changed MockImportable(2, a=20)
+    removed MockImportable(3, a=3)
+    added MockImportable(4, a=4)
+
+    Changed elements come from the destination and have already been synced
+    with their source counterparts. Elements that are in sync are skipped.
+
+    A `ValueError` should be raised if any of the iterables contain
+    duplicates:
+
+    >>> list(merge_sync([MockImportable(1), MockImportable(1)], []))
+    ... # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ValueError:
+
+    """
+    sentinel = object()
+    source = _iter_unique(ordered_source, sentinel)
+    destination = _iter_unique(ordered_destination, sentinel)
+    s = next(source)
+    d = next(destination)
+    while s is not sentinel and d is not sentinel:
+        if s < d:
+            yield 'added', s
+            s = next(source)
+        elif d < s:
+            yield 'removed', d
+            d = next(destination)
+        else:
+            if d.sync(s):
+                yield 'changed', d
+            s = next(source)
+            d = next(destination)
+    while s is not sentinel:
+        yield 'added', s
+        s = next(source)
+    while d is not sentinel:
+        yield 'removed', d
+        d = next(destination)
+
+
+def chunked_loader(ordered_iter1, ordered_iter2, chunk_hint=16384,
+                   read_ahead=0):
     """A loading strategy for running large imports as multiple smaller ones.
 
     The main functionality of this loader is to split two order iterators in
@@ -99,7 +723,22 @@ def chunked_loader(ordered_iter1, ordered_iter2, chunk_hint=16384):
     >>> sorted(destination)
     [6]
 
+    When loading is I/O bound, for example when the elements come from a
+    remote API or a database, both iterators can be read concurrently on
+    background threads by setting *read_ahead* to the number of elements to
+    read ahead of the merge on each side. This way the latency of one side
+    overlaps with fetching the other one and with processing the chunks:
+
+    >>> loader = chunked_loader(iter([1, 3, 5]), iter([2, 4, 6]), 4,
+    ...                         read_ahead=2)
+    >>> [(sorted(s), sorted(d)) for s, d in loader]
+    [([1, 3], [2, 4]), ([5], [6])]
+
     """
+    if read_ahead > 0:
+        batch = max(1, int(read_ahead) // 4)
+        ordered_iter1 = prefetch(ordered_iter1, size=4, batch=batch)
+        ordered_iter2 = prefetch(ordered_iter2, size=4, batch=batch)
     i1 = _iter_const(ordered_iter1, True)
     i2 = _iter_const(ordered_iter2, False)
     iterator = heapq.merge(i1, i2)
@@ -130,3 +769,20 @@ def chunked_loader(ordered_iter1, ordered_iter2, chunk_hint=16384):
 def _iter_const(g, const):
     for value in g:
         yield value, const
+
+
+def _iter_unique(ordered_iter, sentinel):
+    """Yield from an ordered iterable and then the sentinel, forever.
+
+    A ``ValueError`` is raised if two consecutive elements are equal.
+
+    """
+    previous = sentinel
+    for element in ordered_iter:
+        if previous is not sentinel and previous == element:
+            err = 'Syncing with an iterable that contains duplicates: %r'
+            raise ValueError(err % element)
+        previous = element
+        yield element
+    while True:
+        yield sentinel
@@ -0,0 +1,130 @@
+"""This module contains durable storage for the progress of imports.
+
+Long running chunked imports can record a checkpoint after each chunk is
+persisted so that, if they fail, they can resume after the last finished
+chunk instead of starting over. See ``resumable_mem_sync``.
+
+Incremental imports can store digests of natural key ranges between runs so
+the ranges that didn't change are skipped. See ``digest_mem_sync``.
+
+"""
+
+import os
+import pickle
+import tempfile
+import time
+
+
+__all__ = ['FileCheckpoint', 'FileRangeDigests']
+
+
+class FileCheckpoint(object):
+    """Store the progress of an import in a local file.
+
+    The checkpoint holds the natural key of the last processed element along
+    with any metadata about the run:
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'import.checkpoint')
+    >>> checkpoint = FileCheckpoint(path)
+    >>> checkpoint.load() is None
+    True
+    >>> checkpoint.save((10, 'b'), chunks=3)
+    >>> state = FileCheckpoint(path).load()
+    >>> state['natural_key'], state['chunks']
+    ((10, 'b'), 3)
+    >>> checkpoint.clear()
+    >>> checkpoint.load() is None
+    True
+
+    Every save writes a temporary file, syncs it to disk and renames it over
+    the previous checkpoint, so a crash never leaves a partially written
+    checkpoint behind.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return the saved state as a ``dict`` or ``None`` if there is none."""
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)
+        except IOError:
+            return None
+
+    def save(self, natural_key, **metadata):
+        """Durably record *natural_key* as the last processed one."""
+        state = dict(metadata, natural_key=natural_key, timestamp=time.time())
+        _dump_atomically(state, self.path)
+
+    def clear(self):
+        """Remove the checkpoint, the next run will start from scratch."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class FileRangeDigests(object):
+    """Store the digests of natural key ranges in a local file.
+
+    The ranges are saved as an ordered list of ``(upper, digest)`` tuples.
+    Each range holds the natural keys greater than the *upper* key of the
+    previous range and up to its own *upper* key. The *upper* key of the last
+    range is ``None`` and the range is unbounded.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'import.digests')
+    >>> digests = FileRangeDigests(path)
+    >>> digests.load() is None
+    True
+    >>> digests.save([(10, 'abc'), (None, 'def')])
+    >>> FileRangeDigests(path).load()
+    [(10, 'abc'), (None, 'def')]
+    >>> digests.clear()
+    >>> digests.load() is None
+    True
+
+    The file is replaced atomically, just like :py:class:`FileCheckpoint`.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return the saved ranges or ``None`` if there are none."""
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)['ranges']
+        except IOError:
+            return None
+
+    def save(self, ranges):
+        """Durably replace the saved ranges with *ranges*."""
+        state = {'ranges': list(ranges), 'timestamp': time.time()}
+        _dump_atomically(state, self.path)
+
+    def clear(self):
+        """Remove the saved ranges, the next run will sync everything."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _dump_atomically(obj, path):
+    """Pickle *obj* to a temporary file and rename it over *path*."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
@@ -9,9 +9,28 @@ structure serves as both input and output argument for the algorithm.
 """
 
 import abc
+import array
+import collections
+import cPickle as pickle
+import itertools
+import marshal
+import sqlite3
+import weakref
 
+from importtools.importables import batched_notifications
 
-__all__ = ['DataSet', 'SimpleDataSet', 'RecordingDataSet']
+
+__all__ = [
+    'DataSet', 'SimpleDataSet', 'RecordingDataSet', 'ColumnarDataSet',
+    'SQLiteDataSet', 'SyncSummary',
+]
+
+
+class SyncSummary(collections.namedtuple(
+        'SyncSummary', ['added', 'removed', 'changed'])):
+    """The number of elements changed by :py:meth:`DataSet.sync`."""
+
+    __slots__ = ()
 
 
 class DataSet(object):
@@ -52,7 +71,12 @@ class DataSet(object):
 
     @abc.abstractmethod
     def sync(self, iterable):
-        """Add, remove and update this elements with those in the iterable."""
+        """Add, remove and update this elements with those in the iterable.
+
+        A :py:class:`SyncSummary` with the number of added, removed and
+        changed elements is returned.
+
+        """
 
 
 class SimpleDataSet(dict, DataSet):
@@ -100,6 +124,7 @@ class SimpleDataSet(dict, DataSet):
     """
 
     _sentinel = object()
+    _synced = object()
 
     def __init__(self, data_loader=None, *args, **kwargs):
         if data_loader is None:
@@ -119,6 +144,8 @@ class SimpleDataSet(dict, DataSet):
                 raise ValueError(err % (k, v))
 
     def add(self, element):
+        # Replace the key too, so every key is the element it maps to.
+        dict.pop(self, element, None)
         self[element] = element
 
     def pop(self, element, default=None):
@@ -150,10 +177,12 @@ class SimpleDataSet(dict, DataSet):
 
         >>> sds = SimpleDataSet()
         >>> sds.sync([Importable(0), Importable(1)])
+        SyncSummary(added=2, removed=0, changed=0)
         >>> sds
         SimpleDataSet([Importable(0), Importable(1)])
 
         >>> sds.sync([Importable(1), Importable(3)])
+        SyncSummary(added=1, removed=1, changed=0)
         >>> sds
         SimpleDataSet([Importable(1), Importable(3)])
 
@@ -164,35 +193,63 @@ class SimpleDataSet(dict, DataSet):
         >>> i1, i2 = MockImportable(0, a=1), MockImportable(0, a=2)
         >>> sds = SimpleDataSet([i1])
         >>> sds.sync([i2])
+        SyncSummary(added=0, removed=0, changed=1)
         >>> sds
         SimpleDataSet([MockImportable(0, a=2)])
 
-        A `ValueError` should be raised if the sync data contains
-        duplicates:
+        The iterable is walked once and the elements seen are marked in
+        place, so no copy of the iterable or of the dataset is made. A
+        `ValueError` should be raised if the sync data contains duplicates.
+        The elements before the duplicate are already synced but nothing is
+        removed:
 
         >>> i1, i2 = MockImportable(0, a=1), MockImportable(0, a=2)
-        >>> sds = SimpleDataSet()
+        >>> sds = SimpleDataSet([MockImportable(1)])
         >>> sds.sync([i1, i2]) # doctest:+IGNORE_EXCEPTION_DETAIL
         Traceback (most recent call last):
         ValueError:
+        >>> sds
+        SimpleDataSet([MockImportable(0, a=1), MockImportable(1)])
 
         """
         sentinel = self._sentinel
-        other = set()
-        for i in iterable:
-            if i in other:
-                err = 'Syncing with an iterable that contains duplicates: %r'
-                raise ValueError(err % i)
-            other.add(i)
-        for element in other:
-            existing = self.get(element, sentinel)
-            if existing is sentinel:
-                self.add(element)
-            else:
-                existing.sync(element)
-        for existing in self:
-            if existing not in other:
-                self.pop(existing)
+        synced = self._synced
+        get = super(SimpleDataSet, self).get
+        mark = super(SimpleDataSet, self).__setitem__
+        added = changed = 0
+        completed = False
+        with batched_notifications():
+            try:
+                for element in iterable:
+                    existing = get(element, sentinel)
+                    if existing is synced:
+                        err = ('Syncing with an iterable that contains '
+                               'duplicates: %r')
+                        raise ValueError(err % element)
+                    if existing is sentinel:
+                        self.add(element)
+                        added += 1
+                    else:
+                        changed_attrs = existing.sync(element)
+                        if changed_attrs:
+                            changed += 1
+                            self._record_sync(existing, changed_attrs)
+                    mark(element, synced)
+                completed = True
+            finally:
+                # Every key is the element it maps to, see ``add``.
+                removed = []
+                for key, value in self.iteritems():
+                    if value is synced:
+                        mark(key, key)
+                    elif completed:
+                        removed.append(key)
+        for existing in removed:
+            self.pop(existing)
+        return SyncSummary(added, len(removed), changed)
+
+    def _record_sync(self, element, changed_attrs):
+        """Called with the attributes *element* changed while syncing."""
 
 
 class RecordingDataSet(SimpleDataSet):
@@ -204,21 +261,80 @@ class RecordingDataSet(SimpleDataSet):
     allows optimal persistence of the changes by grouping them in a way suited
     for batch processing.
 
+    Changes are recorded through a tracker slot of the elements, which holds
+    a single dataset. An element should belong to one live dataset at a
+    time. If it's added to a second one, that dataset is notified through a
+    listener instead, which costs more, but both still record the changes:
+
+    >>> from importtools import Importable
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a']
+    >>> i = MockImportable(0, a=1)
+    >>> rds1, rds2 = RecordingDataSet([i]), RecordingDataSet([i])
+    >>> i.update(a=2)
+    frozenset(['a'])
+    >>> list(rds1.changed), list(rds2.changed)
+    ([MockImportable(0, a=2)], [MockImportable(0, a=2)])
+
     """
 
     def __init__(self, data_loader=tuple(), *args, **kwargs):
         self._added = SimpleDataSet()
         self._removed = SimpleDataSet()
-        self._changed = set()
+        # Maps the changed elements to the names of their changed attributes
+        # or to None if they are not known.
+        self._changed = {}
+        self._synced_attrs = {}
+        # Elements only hold a weak reference to the dataset, so there are no
+        # reference cycles keeping a dropped dataset and its elements alive.
+        self._ref = weakref.ref(self)
         super(RecordingDataSet, self).__init__(
-            self._registered_elements(data_loader),
+            self._tracked_elements(data_loader),
             *args, **kwargs
         )
 
-    def _registered_elements(self, data_loader):
-        rc = self._register_change
+    def __reduce__(self):
+        """Pickle the elements together with the recorded changes.
+
+        Trackers are not pickled so the dataset tracks the unpickled elements
+        again:
+
+        >>> import pickle
+        >>> from importtools import Importable
+        >>> rds = RecordingDataSet([Importable(1), Importable(2)])
+        >>> rds.add(Importable(3))
+        >>> rds.pop(Importable(1))
+        Importable(1)
+        >>> c = pickle.loads(pickle.dumps(rds, pickle.HIGHEST_PROTOCOL))
+        >>> c
+        RecordingDataSet([Importable(2), Importable(3)])
+        >>> list(c.added), list(c.removed)
+        ([Importable(3)], [Importable(1)])
+        >>> c.get(Importable(2))._tracker() is c
+        True
+        >>> c.get(Importable(3))._tracker is None
+        True
+
+        """
+        state = (
+            list(self._added), list(self._removed), self._changed.items()
+        )
+        return self.__class__, (), state, None, self.iteritems()
+
+    def __setstate__(self, state):
+        added, removed, changed = state
+        self._added = SimpleDataSet(added)
+        self._removed = SimpleDataSet(removed)
+        self._changed = dict(changed)
+        ref = self._ref
+        for element in itertools.chain(self.itervalues(), removed):
+            if self._added.get(element) is not element:
+                element._track(ref)
+
+    def _tracked_elements(self, data_loader):
+        ref = self._ref
         for element in data_loader:
-            element.register(rc)
+            element._track(ref)
             yield element
 
     def add(self, element):
@@ -323,11 +439,71 @@ class RecordingDataSet(SimpleDataSet):
     def _register_change(self, element):
         """Mark an element in the current dataset as changed.
 
-        This method is registered as a listener for changes in all the
-        elements of the wrapped :py:class:`DataSet`.
+        The dataset is set as the tracker of all the elements of the wrapped
+        :py:class:`DataSet` so this method is called when they change.
 
         """
-        self._changed.add(element)
+        changed = self._changed
+        attrs = self._synced_attrs.pop(element, None)
+        if element in changed:
+            recorded = changed[element]
+            if recorded is not None and attrs is not None:
+                attrs = recorded | attrs
+            else:
+                attrs = None
+        changed[element] = attrs
+
+    def _register_changes(self, elements):
+        """Mark a batch of elements as changed at once."""
+        for element in elements:
+            self._register_change(element)
+
+    def _record_sync(self, element, changed_attrs):
+        # The notification of the change follows, maybe delayed by a batch.
+        synced_attrs = self._synced_attrs
+        if not isinstance(changed_attrs, (set, frozenset)):
+            # Overrides of ``sync`` may return just a boolean, the changed
+            # attributes are then unknown.
+            synced_attrs.pop(element, None)
+            return
+        previous = synced_attrs.get(element)
+        if previous is not None:
+            changed_attrs = previous | changed_attrs
+        synced_attrs[element] = changed_attrs
+
+    def changed_attrs(self, element):
+        """Return the names of the attributes changed in *element*.
+
+        The names are recorded when the dataset syncs the element. For other
+        changes, like direct assignments, they are not known and ``None`` is
+        returned, same as for elements that didn't change:
+
+        >>> from importtools import Importable
+        >>> class MockImportable(Importable):
+        ...     __content_attrs__ = ['a', 'b']
+        >>> rds = RecordingDataSet([MockImportable(0, a=1, b=1),
+        ...                         MockImportable(1, a=1, b=1)])
+        >>> rds.sync([MockImportable(0, a=2, b=1), MockImportable(1, a=1, b=1)])
+        SyncSummary(added=0, removed=0, changed=1)
+        >>> rds.changed_attrs(MockImportable(0))
+        frozenset(['a'])
+        >>> rds.get(MockImportable(1)).b = 2
+        >>> rds.changed_attrs(MockImportable(1)) is None
+        True
+
+        The same goes for elements whose ``sync`` only returns a boolean:
+
+        >>> class BooleanImportable(MockImportable):
+        ...     def sync(self, other):
+        ...         return bool(super(BooleanImportable, self).sync(other))
+        >>> rds = RecordingDataSet([BooleanImportable(0, a=1, b=1)])
+        >>> rds.sync([BooleanImportable(0, a=2, b=1)])
+        SyncSummary(added=0, removed=0, changed=1)
+        >>> rds.changed_attrs(BooleanImportable(0)) is None
+        True
+
+        """
+        return self._changed.get(element)
 
     def clear(self):
         self.reset()
@@ -339,13 +515,13 @@ class RecordingDataSet(SimpleDataSet):
         Calling this method will empty out `added`, `removed` and `changed`.
 
         """
-        rc = self._register_change
+        ref = self._ref
         for element in self._added:
-            if not element.is_registered(rc):
-                element.register(rc)
+            element._track(ref)
         self._added.clear()
         self._removed.clear()
         self._changed.clear()
+        self._synced_attrs.clear()
 
     @property
     def added(self):
@@ -369,3 +545,574 @@ class RecordingDataSet(SimpleDataSet):
 
         """
         return iter(self._changed)
+
+
+class ColumnarDataSet(DataSet):
+    """A compact :py:class:`DataSet` that stores elements column by column.
+
+    Instead of keeping ``Importable`` instances around, the natural keys and
+    the values of each content attribute are kept in parallel columns. A
+    column is an :py:class:`array.array` if a type code is given for it in
+    *typecodes* or a :py:class:`list` otherwise. Elements are built with
+    *ImportableFactory* every time they are accessed, so changing them has no
+    effect on the dataset unless they are added back:
+
+    >>> from importtools import Importable
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a', 'b']
+
+    >>> cds = ColumnarDataSet(MockImportable, [
+    ...     MockImportable(1, a=1, b='x'), MockImportable(2, a=2)
+    ... ], typecodes={'a': 'l'})
+    >>> cds
+    ColumnarDataSet([MockImportable(1, a=1, b='x'), MockImportable(2, a=2)])
+    >>> cds.get(MockImportable(2))
+    MockImportable(2, a=2)
+    >>> cds.get(MockImportable(3), 'default')
+    'default'
+    >>> cds.pop(MockImportable(1))
+    MockImportable(1, a=1, b='x')
+    >>> cds.add(MockImportable(1, a=10))
+    >>> cds
+    ColumnarDataSet([MockImportable(1, a=10), MockImportable(2, a=2)])
+
+    Syncing compares the content column by column and, just like
+    ``Importable.sync``, skips the attributes missing from the new elements:
+
+    >>> cds.sync([MockImportable(2, b='y'), MockImportable(3, a=3)])
+    SyncSummary(added=1, removed=1, changed=1)
+    >>> cds
+    ColumnarDataSet([MockImportable(2, a=2, b='y'), MockImportable(3, a=3)])
+
+    Attributes stored in typed columns can't be missing:
+
+    >>> cds.add(MockImportable(4)) # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ValueError:
+
+    A `ValueError` should be raised if the initial or the sync data contains
+    duplicates:
+
+    >>> cds.sync([MockImportable(2), MockImportable(2)])
+    ... # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ValueError:
+
+    """
+
+    _missing = object()
+
+    def __init__(self, ImportableFactory, data_loader=None, typecodes=None):
+        self._factory = ImportableFactory
+        self._attrs = sorted(ImportableFactory._content_attrs)
+        self._typecodes = dict(typecodes or {})
+        self._keys = []
+        self._index = {}
+        self._columns = {}
+        self.clear()
+        if data_loader is None:
+            data_loader = tuple()
+        err = 'The initial list for dataset can not contain duplicates: %r'
+        for element in data_loader:
+            if element.natural_key in self._index:
+                raise ValueError(err % element)
+            self.add(element)
+
+    def _new_column(self, attr, values=()):
+        typecode = self._typecodes.get(attr)
+        if typecode is None:
+            return list(values)
+        return array.array(typecode, values)
+
+    def _values(self, element):
+        missing = self._missing
+        for attr in self._attrs:
+            value = getattr(element, attr, missing)
+            if value is missing and attr in self._typecodes:
+                raise ValueError(
+                    'Attribute %s is required by its typed column: %r'
+                    % (attr, element)
+                )
+            yield attr, value
+
+    def _materialize(self, row):
+        missing = self._missing
+        content = {}
+        for attr in self._attrs:
+            value = self._columns[attr][row]
+            if value is not missing:
+                content[attr] = value
+        return self._factory(self._keys[row], **content)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return (self._materialize(row) for row in xrange(len(self._keys)))
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '%s(%r)' % (cls_name, sorted(self))
+
+    def get(self, element, default=None):
+        row = self._index.get(element.natural_key)
+        if row is None:
+            return default
+        return self._materialize(row)
+
+    def add(self, element):
+        values = list(self._values(element))
+        natural_key = element.natural_key
+        row = self._index.get(natural_key)
+        if row is None:
+            self._index[natural_key] = len(self._keys)
+            self._keys.append(natural_key)
+            for attr, value in values:
+                self._columns[attr].append(value)
+        else:
+            for attr, value in values:
+                self._columns[attr][row] = value
+
+    def pop(self, element, default=None):
+        row = self._index.pop(element.natural_key, None)
+        if row is None:
+            return default
+        e = self._materialize(row)
+        # Move the last row in place of the removed one to keep the columns
+        # dense.
+        last = len(self._keys) - 1
+        keys = self._keys
+        if row != last:
+            keys[row] = keys[last]
+            self._index[keys[row]] = row
+            for column in self._columns.itervalues():
+                column[row] = column[last]
+        keys.pop()
+        for column in self._columns.itervalues():
+            column.pop()
+        return e
+
+    def clear(self):
+        self._keys = []
+        self._index = {}
+        self._columns = dict(
+            (attr, self._new_column(attr)) for attr in self._attrs
+        )
+
+    def sync(self, iterable):
+        index = self._index
+        seen = set()
+        matched_rows = []
+        matched = []
+        new = []
+        for element in iterable:
+            natural_key = element.natural_key
+            if natural_key in seen:
+                err = 'Syncing with an iterable that contains duplicates: %r'
+                raise ValueError(err % element)
+            seen.add(natural_key)
+            row = index.get(natural_key)
+            if row is None:
+                new.append(element)
+            else:
+                matched_rows.append(row)
+                matched.append(element)
+
+        missing = self._missing
+        changed = set()
+        for attr in self._attrs:
+            column = self._columns[attr]
+            values = [getattr(e, attr, missing) for e in matched]
+            for row, value in itertools.izip(matched_rows, values):
+                if value is not missing and column[row] != value:
+                    column[row] = value
+                    changed.add(row)
+
+        removed = len(self._keys) - len(matched_rows)
+        if removed:
+            keep = [r for r, k in enumerate(self._keys) if k in seen]
+            self._keys = [self._keys[r] for r in keep]
+            self._index = dict((k, r) for r, k in enumerate(self._keys))
+            for attr in self._attrs:
+                column = self._columns[attr]
+                self._columns[attr] = self._new_column(
+                    attr, [column[r] for r in keep]
+                )
+
+        for element in new:
+            self.add(element)
+        return SyncSummary(len(new), removed, len(changed))
+
+
+class SQLiteDataSet(DataSet):
+    """A :py:class:`DataSet` stored in a SQLite database on disk.
+
+    This dataset can hold more elements than fit in memory and, unlike
+    chunked imports, doesn't need the data to be sorted. Just like
+    :py:class:`ColumnarDataSet`, the natural keys and the content are stored
+    and the elements are built with *ImportableFactory* when accessed. At most
+    *cache_size* of the elements built are kept in memory and changes to them
+    are written back to the database when they are evicted from the cache or
+    by :py:meth:`flush`. The changes are recorded just like
+    :py:class:`RecordingDataSet` does:
+
+    >>> from importtools import Importable
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a']
+
+    >>> sds = SQLiteDataSet(MockImportable, [
+    ...     MockImportable(1, a=1), MockImportable(2, a=2),
+    ... ], cache_size=1)
+    >>> sds
+    SQLiteDataSet([MockImportable(1, a=1), MockImportable(2, a=2)])
+    >>> sds.get(MockImportable(3), 'default')
+    'default'
+    >>> sds.sync([MockImportable(2, a=20), MockImportable(3, a=3)])
+    SyncSummary(added=1, removed=1, changed=1)
+    >>> sds
+    SQLiteDataSet([MockImportable(2, a=20), MockImportable(3, a=3)])
+    >>> list(sds.added), list(sds.removed), list(sds.changed)
+    ([MockImportable(3, a=3)], [MockImportable(1, a=1)], [MockImportable(2, a=20)])
+
+    Elements taken from the dataset are tracked even after they are evicted
+    from the cache:
+
+    >>> i2 = sds.get(MockImportable(2))
+    >>> i3 = sds.get(MockImportable(3))
+    >>> sds.reset()
+    >>> i2.a = 200
+    >>> sds.get(MockImportable(2))
+    MockImportable(2, a=200)
+    >>> list(sds.changed)
+    [MockImportable(2, a=200)]
+
+    Since elements are compared by natural key only, adding back an element
+    that was removed is recorded as both a removal and an addition.
+
+    The natural keys are stored in a canonical form so keys that are equal
+    in Python match, even if their types differ, like ``int`` and ``long``,
+    ``str`` and ``unicode`` or ``1`` and ``1.0``:
+
+    >>> keys = SQLiteDataSet(MockImportable, [
+    ...     MockImportable((1L, u'a', u'a'), a=1),
+    ... ])
+    >>> a = 'a'
+    >>> keys.get(MockImportable((1, 'a', a)))
+    MockImportable((1L, u'a', u'a'), a=1)
+    >>> keys.sync([MockImportable((1.0, a, 'a'), a=1)])
+    SyncSummary(added=0, removed=0, changed=0)
+    >>> keys.close()
+
+    Key components of other types, like ``datetime``, are compared by their
+    pickled value.
+
+    By default the database is a private temporary file deleted when the
+    dataset is closed. An existing database *path* is reopened with its
+    elements and recorded changes.
+
+    A `ValueError` should be raised if the initial or the sync data contains
+    duplicates. Unlike the in-memory datasets, the changes made before the
+    duplicate was found are kept:
+
+    >>> sds.sync([MockImportable(2), MockImportable(2)])
+    ... # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ValueError:
+    >>> sds.close()
+
+    """
+
+    _sentinel = object()
+
+    def __init__(self, ImportableFactory, data_loader=None, path='',
+                 cache_size=65536):
+        self._factory = ImportableFactory
+        self._attrs = sorted(ImportableFactory._content_attrs)
+        self._cache_size = max(int(cache_size), 1)
+        self._cache = collections.OrderedDict()
+        self._dirty = set()
+        self._ref = weakref.ref(self)
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE IF NOT EXISTS elements (
+                key BLOB PRIMARY KEY, element BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS added (key BLOB PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS removed (
+                key BLOB PRIMARY KEY, element BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS changed (key BLOB PRIMARY KEY);
+            CREATE TEMP TABLE synced (key BLOB PRIMARY KEY);
+        """)
+        if data_loader is None:
+            data_loader = tuple()
+        err = 'The initial list for dataset can not contain duplicates: %r'
+        insert = 'INSERT INTO elements VALUES (?, ?)'
+        for element in data_loader:
+            try:
+                self._db.execute(insert, self._encode(element))
+            except sqlite3.IntegrityError:
+                raise ValueError(err % element)
+
+    def _encode_key(self, natural_key):
+        # Version 0 of the marshal format has no references to previously
+        # written strings, so equal keys are always encoded the same way.
+        return buffer(marshal.dumps(_canonical_key(natural_key), 0))
+
+    def _encode(self, element):
+        sentinel = self._sentinel
+        content = {}
+        for attr in self._attrs:
+            value = getattr(element, attr, sentinel)
+            if value is not sentinel:
+                content[attr] = value
+        natural_key = element.natural_key
+        data = pickle.dumps((natural_key, content), pickle.HIGHEST_PROTOCOL)
+        return self._encode_key(natural_key), buffer(data)
+
+    def _build(self, data):
+        natural_key, content = pickle.loads(str(data))
+        return self._factory(natural_key, **content)
+
+    def _decode(self, key, data):
+        """Return the cached element for *data* or build and track a new one."""
+        natural_key, content = pickle.loads(str(data))
+        element = self._cache.get(natural_key)
+        if element is None:
+            element = self._factory(natural_key, **content)
+            element._track(self._ref)
+        return element
+
+    def _cache_element(self, element):
+        cache = self._cache
+        cache[element.natural_key] = element
+        element._track(self._ref)
+        if len(cache) > self._cache_size:
+            natural_key, evicted = cache.popitem(last=False)
+            if natural_key in self._dirty:
+                self._dirty.discard(natural_key)
+                self._write_back(evicted)
+
+    def _write_back(self, element):
+        # Update the row in place so the cursors reading the table never see
+        # it twice.
+        key, data = self._encode(element)
+        self._db.execute(
+            'UPDATE elements SET element = ? WHERE key = ?', (data, key)
+        )
+
+    def _select(self, sql):
+        self.flush()
+        for key, data in self._db.execute(sql):
+            yield self._decode(key, data)
+
+    def flush(self):
+        """Write the changes of the cached elements to the database."""
+        cache = self._cache
+        for natural_key in self._dirty:
+            self._write_back(cache[natural_key])
+        self._dirty.clear()
+
+    def close(self):
+        """Write all the changes and close the database."""
+        self.flush()
+        self._db.commit()
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM elements').fetchone()[0]
+
+    def __iter__(self):
+        return self._select('SELECT key, element FROM elements')
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '%s(%r)' % (cls_name, sorted(self))
+
+    def _load(self, natural_key, default):
+        """Build and track the stored element without caching it."""
+        row = self._db.execute(
+            'SELECT element FROM elements WHERE key = ?',
+            (self._encode_key(natural_key),)
+        ).fetchone()
+        if row is None:
+            return default
+        element = self._build(row[0])
+        element._track(self._ref)
+        return element
+
+    def get(self, element, default=None):
+        natural_key = element.natural_key
+        cache = self._cache
+        existing = cache.pop(natural_key, None)
+        if existing is not None:
+            cache[natural_key] = existing
+            return existing
+        existing = self._load(natural_key, None)
+        if existing is None:
+            return default
+        self._cache_element(existing)
+        return existing
+
+    def add(self, element):
+        natural_key = element.natural_key
+        if self._cache.get(natural_key) is element:
+            return
+        key, data = self._encode(element)
+        db = self._db
+        added = db.execute('SELECT 1 FROM added WHERE key = ?', (key,))
+        if added.fetchone() is None:
+            # If we are replacing an original element mark it as deleted.
+            if natural_key in self._dirty:
+                self.flush()
+            db.execute(
+                'INSERT OR REPLACE INTO removed '
+                'SELECT key, element FROM elements WHERE key = ?', (key,)
+            )
+            db.execute('INSERT INTO added VALUES (?)', (key,))
+        db.execute('INSERT OR REPLACE INTO elements VALUES (?, ?)', (key, data))
+        self._dirty.discard(natural_key)
+        self._cache_element(element)
+
+    def pop(self, element, default=None):
+        sentinel = self._sentinel
+        e = self.get(element, sentinel)
+        if e is sentinel:
+            return default
+        natural_key = element.natural_key
+        del self._cache[natural_key]
+        self._dirty.discard(natural_key)
+        key, data = self._encode(e)
+        db = self._db
+        if db.execute('DELETE FROM added WHERE key = ?', (key,)).rowcount == 0:
+            db.execute(
+                'INSERT OR REPLACE INTO removed VALUES (?, ?)', (key, data)
+            )
+        db.execute('DELETE FROM elements WHERE key = ?', (key,))
+        return e
+
+    def _register_change(self, element):
+        """Mark an element as changed, see ``RecordingDataSet``."""
+        natural_key = element.natural_key
+        key = self._encode_key(natural_key)
+        db = self._db
+        if self._cache.get(natural_key) is not element:
+            # The element was evicted from the cache. Changes to elements
+            # that were removed in the meantime are ignored.
+            row = db.execute('SELECT 1 FROM elements WHERE key = ?', (key,))
+            if row.fetchone() is None:
+                return
+            self._cache_element(element)
+        self._dirty.add(natural_key)
+        db.execute(
+            'INSERT OR IGNORE INTO changed SELECT ? '
+            'WHERE NOT EXISTS (SELECT 1 FROM added WHERE key = ?)',
+            (key, key)
+        )
+
+    def clear(self):
+        self.reset()
+        self._db.execute('DELETE FROM elements')
+        self._cache.clear()
+
+    def sync(self, iterable):
+        sentinel = self._sentinel
+        db = self._db
+        db.execute('DELETE FROM synced')
+        err = 'Syncing with an iterable that contains duplicates: %r'
+        added = changed = 0
+        with batched_notifications():
+            for element in iterable:
+                try:
+                    db.execute(
+                        'INSERT INTO synced VALUES (?)',
+                        (self._encode_key(element.natural_key),)
+                    )
+                except sqlite3.IntegrityError:
+                    raise ValueError(err % element)
+                # Most elements don't change, so they are not cached. The
+                # changed ones are cached when they register the change.
+                existing = self._cache.get(element.natural_key)
+                if existing is None:
+                    existing = self._load(element.natural_key, sentinel)
+                if existing is sentinel:
+                    self.add(element)
+                    added += 1
+                elif existing.sync(element):
+                    changed += 1
+        # The changes are registered when the batch is delivered.
+        self.flush()
+        removed = len(self)
+        db.executescript("""
+            INSERT OR IGNORE INTO removed
+                SELECT key, element FROM elements
+                WHERE key NOT IN (SELECT key FROM synced)
+                AND key NOT IN (SELECT key FROM added);
+            DELETE FROM added WHERE key NOT IN (SELECT key FROM synced);
+            DELETE FROM elements WHERE key NOT IN (SELECT key FROM synced);
+            DELETE FROM synced;
+        """)
+        self._cache.clear()
+        return SyncSummary(added, removed - len(self), changed)
+
+    def reset(self):
+        """Forget all recorded changes, see ``RecordingDataSet``."""
+        self.flush()
+        self._db.executescript("""
+            DELETE FROM added;
+            DELETE FROM removed;
+            DELETE FROM changed;
+        """)
+
+    @property
+    def added(self):
+        """An iterable of all added elements in the dataset."""
+        return self._select(
+            'SELECT e.key, e.element FROM added a '
+            'JOIN elements e ON a.key = e.key'
+        )
+
+    @property
+    def removed(self):
+        """An iterable of all removed elements in the dataset."""
+        self.flush()
+        rows = self._db.execute('SELECT key, element FROM removed')
+        for key, data in rows.fetchall():
+            yield self._build(data)
+
+    @property
+    def changed(self):
+        """An iterable of all elements that have been changed.
+
+        Just like for ``RecordingDataSet``, an element can be both changed
+        and removed.
+
+        """
+        return self._select(
+            'SELECT c.key, COALESCE(e.element, r.element) FROM changed c '
+            'LEFT JOIN elements e ON c.key = e.key '
+            'LEFT JOIN removed r ON c.key = r.key'
+        )
+
+
+def _canonical_key(value):
+    """Return a marshalable value that is the same for equal natural keys."""
+    if isinstance(value, tuple):
+        return tuple(_canonical_key(v) for v in value)
+    if isinstance(value, (bool, int, long)):
+        return int(value)
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str):
+        # Only ASCII strings are equal to their unicode counterparts.
+        try:
+            return value.decode('ascii')
+        except UnicodeDecodeError:
+            return value
+    if value is None or isinstance(value, unicode):
+        return value
+    # ASCII strings are canonical as unicode, so this marker never clashes
+    # with a canonical key.
+    return ('pickled', pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
@@ -6,22 +6,43 @@ instances used to create ``DataSet`` instances.
 
 """
 
+import itertools
 import operator
 
 from importtools import RecordingDataSet
 
 
 class DjangoLoader(object):
-    def __init__(self, Model, natural_key_attrs, content_attrs):
+    """Load ``(natural_key, content)`` row data of a Django model.
+
+    When paging through the rows with :py:meth:`load_buffered` on a composite
+    natural key, the next page is selected with a row-value comparison like
+    ``(a, b) > (x, y)`` which planners can turn into a single index range
+    scan. On backends that don't support row values the equivalent
+    ``a > x OR (a = x AND b > y)`` condition is used instead. Set
+    *row_values* to ``True`` or ``False`` to override the detection.
+
+    """
+
+    def __init__(self, Model, natural_key_attrs, content_attrs,
+                 row_values=None):
         self._model = Model
         self._natural_key_attrs = natural_key_attrs
         self._content_attrs = content_attrs
+        self._row_values = row_values
 
-    def _get_basic_q(self):
+    def _get_basic_q(self, lock=True):
         all_fields = list(self._content_attrs) + list(self._natural_key_attrs)
-        q = self._model.objects.all().select_for_update()
+        q = self._model.objects.all()
+        if lock:
+            q = q.select_for_update()
         return q.values(*all_fields)
 
+    def _get_values_list_q(self):
+        all_fields = list(self._natural_key_attrs) + list(self._content_attrs)
+        q = self._model.objects.all().select_for_update()
+        return q.values_list(*all_fields)
+
     def _yield_from_q(self, q):
         for row in q:
             natural_key = []
@@ -61,41 +82,437 @@ class DjangoLoader(object):
 
         return reduce(operator.or_, all_partials)
 
+    def _get_connection(self):
+        from django.db import connections, router
+        return connections[router.db_for_read(self._model)]
+
+    def _use_row_values(self):
+        if len(self._natural_key_attrs) < 2:
+            return False
+        if self._row_values is not None:
+            return self._row_values
+        connection = self._get_connection()
+        if connection.vendor in ('postgresql', 'mysql'):
+            return True
+        if connection.vendor == 'sqlite':
+            import sqlite3
+            return sqlite3.sqlite_version_info >= (3, 15, 0)
+        return False
+
+    def _make_row_values_cond(self, last_row, op='>'):
+        connection = self._get_connection()
+        qn = connection.ops.quote_name
+        opts = self._model._meta
+        columns = []
+        params = []
+        for key in self._natural_key_attrs:
+            field = opts.get_field(key)
+            columns.append('%s.%s' % (qn(opts.db_table), qn(field.column)))
+            params.append(field.get_db_prep_value(last_row[key], connection))
+        placeholders = ', '.join(['%s'] * len(params))
+        where = '(%s) %s (%s)' % (', '.join(columns), op, placeholders)
+        return where, params
+
+    def _filter_after(self, q, last_row):
+        """Filter *q* to the rows after *last_row* in natural key order."""
+        if self._use_row_values():
+            where, params = self._make_row_values_cond(last_row)
+            return q.extra(where=[where], params=params)
+        return q.filter(self._make_cond(last_row))
+
+    def _filter_up_to(self, q, last_row):
+        """Filter *q* to the rows up to and including *last_row*."""
+        if self._use_row_values():
+            where, params = self._make_row_values_cond(last_row, '<=')
+            return q.extra(where=[where], params=params)
+        return q.exclude(self._make_cond(last_row))
+
     def load_all(self):
         for row_data, row in self._yield_from_q(self._get_basic_q()):
             yield row_data
 
-    def load_buffered(self, buffer_size=16384):
+    def load_buffered(self, buffer_size=16384, prefetch=0, after=None,
+                      up_to=None):
+        """Load all the rows ordered by natural key, one page at a time.
+
+        Every page of *buffer_size* rows is loaded with a keyset query that
+        starts after the last row of the previous page. If the natural key
+        tuple *after* is given, only the rows after it are loaded, using the
+        same keyset condition. Likewise, if *up_to* is given only the rows up
+        to and including it are loaded.
+
+        When *prefetch* is positive, the pages are loaded on a background
+        thread while the consumer works on the current one, keeping at most
+        *prefetch* pages buffered. The queries then run on a separate
+        database connection, outside of the caller's transaction, so the rows
+        are not locked for update in this mode.
+
+        """
         buffer_size = int(buffer_size)
         if buffer_size <= 0:
             raise ValueError("Buffer size must be positive.")
 
-        base_q = self._get_basic_q()
-        base_q = base_q.order_by(*self._natural_key_attrs)
-        first_q = base_q[:buffer_size]
+        lower, upper = self._key_row(after), self._key_row(up_to)
+        if prefetch > 0:
+            pages = self._prefetch_pages(buffer_size, prefetch, lower, upper)
+        else:
+            pages = self._load_pages(buffer_size, lower=lower, upper=upper)
+        return self._iter_pages(pages)
 
-        count = -1
-        for count, (row_data, row) in enumerate(
-            self._yield_from_q(first_q), 1
-        ):
-            last_row = row
-            yield row_data
+    def _key_row(self, natural_key):
+        if natural_key is None:
+            return None
+        return dict(zip(self._natural_key_attrs, natural_key))
+
+    def load_partitions(self, partitions, buffer_size=16384, prefetch=1):
+        """Split the rows in contiguous natural key ranges loaded in parallel.
+
+        The boundaries of the ranges are the natural keys found at evenly
+        spaced offsets in the ordered rows, so each range holds about the
+        same number of rows. A list of at most *partitions* iterators is
+        returned, one for each range in order. Each range is loaded on its own
+        background thread and database connection, prefetching up to
+        *prefetch* pages of *buffer_size* rows. Just like
+        :py:meth:`load_buffered` with prefetching enabled, the rows are not
+        locked for update.
 
-        while count == buffer_size:
-            q = base_q.filter(self._make_cond(last_row))[:buffer_size]
-            count = -1
-            for count, (row_data, row) in enumerate(self._yield_from_q(q), 1):
-                last_row = row
+        The iterators are independent so they can be consumed in parallel,
+        for example by syncing every range separately.
+
+        """
+        buffer_size = int(buffer_size)
+        if buffer_size <= 0:
+            raise ValueError("Buffer size must be positive.")
+        prefetch = max(int(prefetch), 1)
+
+        bounds = [None] + self._partition_bounds(partitions) + [None]
+        streams = []
+        for lower, upper in zip(bounds, bounds[1:]):
+            pages = self._prefetch_pages(buffer_size, prefetch, lower, upper)
+            streams.append(self._iter_pages(pages))
+        return streams
+
+    def load_parallel(self, partitions, buffer_size=16384, prefetch=1):
+        """Load all the rows ordered by natural key from parallel ranges.
+
+        This presents the ranges of :py:meth:`load_partitions` as a single
+        ordered stream. All the ranges start loading right away but each one
+        only loads *prefetch* pages ahead of the consumer, so memory usage
+        stays bounded.
+
+        """
+        return itertools.chain.from_iterable(
+            self.load_partitions(partitions, buffer_size, prefetch)
+        )
+
+    def _partition_bounds(self, partitions):
+        """Return the last rows of the first ``partitions - 1`` ranges.
+
+        The natural keys are read in a single ordered pass, stopping at the
+        last boundary, instead of running an ``OFFSET`` query for each
+        boundary, which would scan the rows before it again every time.
+
+        """
+        partitions = int(partitions)
+        if partitions <= 0:
+            raise ValueError("The number of partitions must be positive.")
+        natural_key_attrs = list(self._natural_key_attrs)
+        q = self._model.objects.order_by(*natural_key_attrs)
+        q = q.values_list(*natural_key_attrs)
+        count = q.count()
+        offsets = iter(sorted(set(
+            i * count // partitions - 1 for i in range(1, partitions)
+            if i * count // partitions > 0
+        )))
+        offset = next(offsets, None)
+        bounds = []
+        if offset is None:
+            return bounds
+        for position, key in enumerate(q.iterator()):
+            if position != offset:
+                continue
+            row = dict(zip(natural_key_attrs, key))
+            if not bounds or bounds[-1] != row:
+                bounds.append(row)
+            offset = next(offsets, None)
+            if offset is None:
+                break
+        return bounds
+
+    def _iter_pages(self, pages):
+        for page in pages:
+            for row_data, row in page:
                 yield row_data
 
+    def _prefetch_pages(self, buffer_size, prefetch, lower=None, upper=None):
+        from importtools import prefetch as prefetch_pages
+        pages = self._closing_connections(
+            self._load_pages(buffer_size, False, lower, upper)
+        )
+        return prefetch_pages(pages, size=prefetch)
+
+    def _load_pages(self, buffer_size, lock=True, lower=None, upper=None):
+        base_q = self._get_basic_q(lock)
+        base_q = base_q.order_by(*self._natural_key_attrs)
+        if upper is not None:
+            base_q = self._filter_up_to(base_q, upper)
+        if lower is not None:
+            q = self._filter_after(base_q, lower)[:buffer_size]
+        else:
+            q = base_q[:buffer_size]
+        while True:
+            page = list(self._yield_from_q(q))
+            if page:
+                yield page
+            if len(page) < buffer_size:
+                break
+            last_row = page[-1][1]
+            q = self._filter_after(base_q, last_row)[:buffer_size]
+
+    def _closing_connections(self, pages):
+        """Close the connections of the thread running *pages* at the end."""
+        from django.db import connections
+        try:
+            for page in pages:
+                yield page
+        finally:
+            for connection in connections.all():
+                connection.close()
+
+    def load_streamed(self, chunk_size=2000, after=None):
+        """Load all the rows ordered by natural key using a single query.
+
+        The rows are streamed with ``QuerySet.iterator`` so backends that
+        support server-side cursors fetch them *chunk_size* at a time. On
+        Django versions where ``iterator`` doesn't accept a chunk size the
+        backend default is used. If the natural key tuple *after* is given,
+        only the rows after it are loaded.
+
+        """
+        chunk_size = int(chunk_size)
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be positive.")
+
+        q = self._get_values_list_q().order_by(*self._natural_key_attrs)
+        if after is not None:
+            q = self._filter_after(q, self._key_row(after))
+        try:
+            rows = q.iterator(chunk_size=chunk_size)
+        except TypeError:
+            rows = q.iterator()
+
+        key_length = len(self._natural_key_attrs)
+        content_attrs = list(self._content_attrs)
+        for row in rows:
+            yield row[:key_length], dict(zip(content_attrs, row[key_length:]))
+
+
+class DjangoWriter(object):
+    """Persist the changes recorded by a ``RecordingDataSet`` in batches.
+
+    The natural keys of the elements must be tuples holding the values of
+    ``natural_key_attrs`` in the same order, as produced by
+    :py:class:`DjangoLoader`. Added elements are inserted with
+    ``bulk_create``, changed elements are saved with ``bulk_update``, or a
+    single ``UPDATE`` using ``CASE`` on older Django versions, and removed
+    elements are deleted by primary key. Each batch of at most
+    ``batch_size`` elements runs in its own transaction.
+
+    If the changed elements know which attributes changed, like
+    ``RecordingImportable.changed_attrs``, or the dataset recorded them while
+    syncing, like ``RecordingDataSet.changed_attrs``, the elements are
+    grouped by the changed attributes and only those columns are updated.
+    Otherwise all the ``content_attrs`` columns are updated.
+
+    """
+
+    def __init__(self, Model, natural_key_attrs, content_attrs,
+                 batch_size=1000):
+        batch_size = int(batch_size)
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive.")
+        self._model = Model
+        self._natural_key_attrs = natural_key_attrs
+        self._content_attrs = content_attrs
+        self._batch_size = batch_size
+
+    def write(self, dataset):
+        """Persist all the changes recorded in the *dataset*."""
+        removed = list(dataset.removed)
+        self.delete(removed)
+        removed = set(removed)
+        self.update(
+            (e for e in dataset.changed if e not in removed),
+            getattr(dataset, 'changed_attrs', None),
+        )
+        self.create(dataset.added)
+
+    def create(self, elements):
+        manager = self._model.objects
+        for batch in self._batches(elements):
+            objs = [self._model(**self._field_values(e)) for e in batch]
+            with self._atomic():
+                manager.bulk_create(objs)
+
+    def update(self, elements, changed_attrs=None):
+        """Save the changed *elements*.
+
+        *changed_attrs* can be a callable returning the names of the changed
+        attributes of an element, or ``None`` if they're not known, like
+        ``RecordingDataSet.changed_attrs``.
+
+        """
+        groups = {}
+        for element in elements:
+            fields = self._changed_fields(element, changed_attrs)
+            if fields:
+                groups.setdefault(fields, []).append(element)
+        for fields, group in sorted(groups.iteritems()):
+            self._update_fields(group, list(fields))
+
+    def _changed_fields(self, element, changed_attrs=None):
+        changed = getattr(element, 'changed_attrs', None)
+        if changed is None and changed_attrs is not None:
+            changed = changed_attrs(element)
+        if changed is None:
+            return tuple(self._content_attrs)
+        return tuple(a for a in self._content_attrs if a in changed)
+
+    def _update_fields(self, elements, fields):
+        manager = self._model.objects
+        for batch in self._batches(elements):
+            with self._atomic():
+                pks = self._get_pks(batch)
+                objs = []
+                for element in batch:
+                    pk = pks.get(tuple(element.natural_key))
+                    if pk is not None:
+                        objs.append(self._model(
+                            pk=pk, **self._field_values(element)
+                        ))
+                if hasattr(manager, 'bulk_update'):
+                    manager.bulk_update(objs, fields)
+                else:
+                    self._update_cases(objs, fields)
+
+    def _update_cases(self, objs, fields):
+        """Update *objs* with one ``UPDATE ... CASE`` query per batch.
+
+        This is what ``bulk_update`` does on Django 2.2 and newer. Django
+        versions without conditional expressions update one row at a time.
+
+        """
+        from django.db import connections, router
+        try:
+            from django.db.models import Case, Value, When
+        except ImportError:
+            Case = None
+
+        manager = self._model.objects
+        if Case is None:
+            for obj in objs:
+                values = dict((f, getattr(obj, f)) for f in fields)
+                manager.filter(pk=obj.pk).update(**values)
+            return
+        meta = self._model._meta
+        connection = connections[router.db_for_write(self._model)]
+        # Every row binds a WHEN primary key and a THEN value for each
+        # updated field, plus its primary key in the WHERE clause.
+        size = connection.ops.bulk_batch_size(
+            ['pk'] * (2 * len(fields) + 1), objs
+        )
+        size = max(size, 1)
+        for start in range(0, len(objs), size):
+            batch = objs[start:start + size]
+            values = {}
+            for name in fields:
+                field = meta.get_field(name)
+                whens = [
+                    When(pk=obj.pk, then=Value(
+                        getattr(obj, field.attname), output_field=field
+                    ))
+                    for obj in batch
+                ]
+                values[field.attname] = Case(*whens, output_field=field)
+            manager.filter(pk__in=[obj.pk for obj in batch]).update(**values)
+
+    def delete(self, elements):
+        manager = self._model.objects
+        for batch in self._batches(elements):
+            with self._atomic():
+                pks = self._get_pks(batch).values()
+                if pks:
+                    manager.filter(pk__in=pks).delete()
+
+    def _atomic(self):
+        from django.db import router, transaction
+        return transaction.atomic(using=router.db_for_write(self._model))
+
+    def _batches(self, elements):
+        elements = iter(elements)
+        while True:
+            batch = list(itertools.islice(elements, self._batch_size))
+            if not batch:
+                break
+            yield batch
+
+    def _field_values(self, element):
+        values = dict(zip(self._natural_key_attrs, element.natural_key))
+        for attr_name in self._content_attrs:
+            try:
+                values[attr_name] = getattr(element, attr_name)
+            except AttributeError:
+                pass
+        return values
+
+    def _get_pks(self, elements):
+        """Map the natural keys of the *elements* to primary keys."""
+        from django.db import connections, router
+        from django.db.models import Q
+
+        natural_key_attrs = list(self._natural_key_attrs)
+        connection = connections[router.db_for_read(self._model)]
+        size = connection.ops.bulk_batch_size(natural_key_attrs, elements)
+        size = max(size, 1)
+        pks = {}
+        for start in range(0, len(elements), size):
+            conds = []
+            for element in elements[start:start + size]:
+                conds.append(
+                    Q(**dict(zip(natural_key_attrs, element.natural_key)))
+                )
+            q = self._model.objects.filter(reduce(operator.or_, conds))
+            for row in q.values_list('pk', *natural_key_attrs):
+                pks[tuple(row[1:])] = row[0]
+        return pks
+
 
 def django_chunked_mem_sync(source_loader,
                             Model, natural_key_attrs, ImportableFactory,
                             content_attrs=None,
                             DSFactory=RecordingDataSet,
-                            hint=16384):
+                            hint=16384,
+                            instrumentation=None,
+                            checkpoint=None,
+                            digests=None):
+    """Run a chunked import with a Django model as the destination.
+
+    If a *checkpoint* is given the import is resumable, see
+    ``resumable_mem_sync``. On restart the destination rows are loaded
+    starting right after the checkpoint using the keyset condition, so the
+    already finished part is never loaded again.
+
+    If range *digests* are given, only the natural key ranges that changed
+    since the previous run are loaded and synced, see ``digest_mem_sync``.
+    The two options can't be combined.
+
+    """
+    from importtools import (
+        chunked_mem_sync, digest_mem_sync, resumable_mem_sync,
+    )
 
-    from importtools import chunked_mem_sync
+    if checkpoint is not None and digests is not None:
+        raise ValueError("Checkpoints and range digests can't be combined.")
 
     content_attrs = (
         content_attrs if content_attrs is not None
@@ -103,12 +520,25 @@ def django_chunked_mem_sync(source_loader,
     )
     loader = DjangoLoader(Model, natural_key_attrs, content_attrs)
 
-    def dest_loader():
-        for row_data in loader:
+    def dest_loader(after=None, up_to=None):
+        for row_data in loader.load_buffered(hint, after=after, up_to=up_to):
             natural_key, content_dict = row_data
             yield ImportableFactory(natural_key, **content_dict)
 
-    for dest_ds in chunked_mem_sync(
-        source_loader, dest_loader(), DSFactory=DSFactory, hint=hint
-    ):
+    if digests is not None:
+        synced = digest_mem_sync(
+            source_loader, dest_loader, digests, DSFactory=DSFactory,
+            hint=hint, instrumentation=instrumentation,
+        )
+    elif checkpoint is None:
+        synced = chunked_mem_sync(
+            source_loader, dest_loader(), DSFactory=DSFactory, hint=hint,
+            instrumentation=instrumentation,
+        )
+    else:
+        synced = resumable_mem_sync(
+            source_loader, dest_loader, checkpoint, DSFactory=DSFactory,
+            hint=hint, instrumentation=instrumentation,
+        )
+    for dest_ds in synced:
         yield dest_ds
@@ -1,7 +1,17 @@
+import os
+import tempfile
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': ':memory:'
+        'NAME': ':memory:',
+        # Some tests load data on background threads, which use their own
+        # connections, so the test database can't be private to one of them.
+        'TEST': {
+            'NAME': os.path.join(
+                tempfile.gettempdir(), 'importtools_tests.sqlite3'
+            ),
+        },
     }
 }
 
@@ -1,8 +1,49 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 
+from importtools import Importable, RecordingImportable
 from importtools.django_tests.models import TestModel
 
 
+class TestImportable(Importable):
+    __content_attrs__ = ['x', 'y']
+
+
+class TestRecordingImportable(RecordingImportable):
+    __content_attrs__ = ['x', 'y']
+
+
+class TestPlainImportable(Importable):
+    _content_attrs = ['x', 'y']
+
+
+class TestInitImportable(TestImportable):
+    def __init__(self, natural_key, x=None, y=None):
+        super(TestInitImportable, self).__init__(natural_key, x=x, y=y)
+
+
+class LossyRepr(object):
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'LossyRepr(...)'
+
+
+class TestDigest(TestCase):
+    def test_values_with_same_repr(self):
+        i1 = TestImportable(0, x=LossyRepr(1))
+        i2 = TestImportable(0, x=LossyRepr(2))
+        self.assertNotEqual(i1.digest, i2.digest)
+        self.assertEqual(i1.sync(i2), frozenset(['x']))
+        self.assertEqual(i1.x, LossyRepr(2))
+
+
 class TestLoading(TestCase):
     def setUp(self):
         for c in range(100):
@@ -45,6 +86,42 @@ class TestLoading(TestCase):
             r.append((natural_key, content))
         self._assert(r)
 
+    def test_load_buffered_without_row_values(self):
+        l = self._get_target()(
+            TestModel, ['a', 'b'], ['x', 'y'], row_values=False
+        )
+        self.assertFalse(l._use_row_values())
+        r = list(l.load_buffered(buffer_size=16))
+        self._assert(r)
+
+    def test_load_buffered_with_row_values(self):
+        l = self._get_target()(
+            TestModel, ['a', 'b'], ['x', 'y'], row_values=True
+        )
+        self.assertTrue(l._use_row_values())
+        r = list(l.load_buffered(buffer_size=16))
+        self._assert(r)
+
+    def test_load_after(self):
+        l = self._make_one()
+        after = (9, 'b 96')
+        expected = [r for r in l.load_all() if r[0] > after]
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(
+            list(l.load_buffered(buffer_size=2, after=after)), expected
+        )
+        self.assertEqual(list(l.load_streamed(after=after)), expected)
+
+    def test_pozitive_chunk_size(self):
+        l = self._make_one()
+        read_one = lambda: l.load_streamed(chunk_size=0).next()
+        self.assertRaises(ValueError, read_one)
+
+    def test_load_streamed(self):
+        l = self._make_one()
+        r = list(l.load_streamed(chunk_size=16))
+        self._assert(r)
+
     def _assert(self, r):
         first, second, third, last = r[0], r[1], r[2], r[-1]
 
@@ -61,3 +138,348 @@ class TestLoading(TestCase):
         natural_key, content = last
         self.assertEqual(natural_key, (9, 'b 99'))
         self.assertEqual(content, {'x': True, 'y': 'y 99'})
+
+
+class TestPrefetchLoading(TransactionTestCase):
+    # The pages are loaded on another thread, using another connection, so
+    # the test data must be committed.
+
+    def setUp(self):
+        for c in range(100):
+            TestModel.objects.create(
+                a=c / 10,
+                b='b %s' % c,
+                x=bool(c % 2),
+                y='y %s' % c,
+            )
+
+    def tearDown(self):
+        TestModel.objects.all().delete()
+
+    def test_load_buffered_prefetch(self):
+        from importtools import DjangoLoader
+        l = DjangoLoader(TestModel, ['a', 'b'], ['x', 'y'])
+        prefetched = list(l.load_buffered(buffer_size=16, prefetch=2))
+        self.assertEqual(len(prefetched), 100)
+        self.assertEqual(prefetched, list(l.load_all()))
+
+    def test_load_partitions(self):
+        from importtools import DjangoLoader
+        for row_values in (True, False):
+            l = DjangoLoader(
+                TestModel, ['a', 'b'], ['x', 'y'], row_values=row_values
+            )
+            partitions = [list(p) for p in l.load_partitions(3, 7)]
+            self.assertEqual(len(partitions), 3)
+            for p in partitions:
+                self.assertTrue(30 <= len(p) <= 40)
+                self.assertEqual(p, sorted(p))
+            rows = [row for p in partitions for row in p]
+            self.assertEqual(rows, sorted(l.load_all()))
+
+    def test_partition_bounds_queries(self):
+        from importtools import DjangoLoader
+        l = DjangoLoader(TestModel, ['a', 'b'], ['x', 'y'])
+        with self.assertNumQueries(2):
+            bounds = l._partition_bounds(10)
+        rows = list(TestModel.objects.order_by('a', 'b').values('a', 'b'))
+        self.assertEqual(bounds, [rows[i * 10 - 1] for i in range(1, 10)])
+        self.assertEqual(l._partition_bounds(1), [])
+        self.assertEqual(l._partition_bounds(200), rows[:-1])
+
+    def test_load_parallel(self):
+        from importtools import DjangoLoader
+        l = DjangoLoader(TestModel, ['a', 'b'], ['x', 'y'])
+        rows = list(l.load_parallel(4, buffer_size=16))
+        self.assertEqual(rows, list(l.load_buffered(buffer_size=16)))
+        self.assertEqual(list(l.load_parallel(200)), rows)
+
+
+class TestChunkedSync(TestCase):
+    def setUp(self):
+        for c in range(20):
+            TestModel.objects.create(
+                a=c / 10, b='b %s' % c, x=False, y='y %s' % c,
+            )
+
+    def tearDown(self):
+        TestModel.objects.all().delete()
+
+    def _source(self):
+        for c in range(5, 25):
+            yield TestImportable((c / 10, 'b %s' % c), x=False, y='y %s' % c)
+
+    def _sync(self, **kwargs):
+        from importtools import django_chunked_mem_sync
+        return django_chunked_mem_sync(
+            self._source(), TestModel, ['a', 'b'], TestImportable,
+            hint=8, **kwargs
+        )
+
+    def test_sync(self):
+        added, removed = [], []
+        for ds in self._sync():
+            added.extend(ds.added)
+            removed.extend(ds.removed)
+        self.assertEqual(len(added), 5)
+        self.assertEqual(len(removed), 5)
+
+    def test_pool(self):
+        import datetime
+        import multiprocessing
+        from importtools import chunked_mem_sync
+
+        def elements(keys, y):
+            r = [TestRecordingImportable(k, x=k % 2, y=y(k)) for k in keys]
+            # Missing content and values marshal can't encode.
+            r[0] = TestRecordingImportable(keys[0], x=0)
+            r[1].y = datetime.date(2000, 1, keys[1] % 28 + 1)
+            return r
+
+        def run(pool):
+            source = elements(range(0, 40, 2), lambda k: k % 4)
+            destination = elements(range(0, 40, 3), lambda k: 0)
+            notified = []
+            destination[2].register(notified.append)
+            result = []
+            for ds in chunked_mem_sync(source, destination, hint=8, pool=pool):
+                result.append((
+                    sorted(e.natural_key for e in ds.added),
+                    sorted(e.natural_key for e in ds.removed),
+                    sorted((e.natural_key, sorted(e.changed_attrs),
+                            sorted(ds.changed_attrs(e)))
+                           for e in ds.changed),
+                    sorted(e.natural_key for e in ds),
+                ))
+            return result, notified
+
+        pool = multiprocessing.Pool(2)
+        try:
+            result, notified = run(pool)
+        finally:
+            pool.close()
+            pool.join()
+        # Listeners stay registered since the elements never leave.
+        self.assertEqual(len(notified), 1)
+        self.assertEqual((result, notified), run(None))
+
+    def test_pool_without_generated_init(self):
+        import multiprocessing
+        from importtools import chunked_mem_sync
+
+        def element(cls, k, **content):
+            # Classes setting ``_content_attrs`` take no content arguments.
+            e = cls(k)
+            e.update(**content)
+            return e
+
+        def run(cls, pool):
+            source = [
+                element(cls, k, x=k % 2, y=k % 4) for k in range(0, 40, 2)
+            ]
+            destination = [
+                element(cls, k, x=k % 2, y=0) for k in range(0, 40, 3)
+            ]
+            return [
+                (sorted(ds.added), sorted(ds.removed), sorted(ds.changed))
+                for ds in chunked_mem_sync(
+                    source, destination, hint=8, pool=pool
+                )
+            ]
+
+        pool = multiprocessing.Pool(2)
+        try:
+            for cls in (TestPlainImportable, TestInitImportable):
+                self.assertEqual(run(cls, pool), run(cls, None))
+        finally:
+            pool.close()
+            pool.join()
+
+    def test_resume(self):
+        import os
+        import tempfile
+        from importtools import FileCheckpoint
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+        checkpoint = FileCheckpoint(path)
+
+        run = self._sync(checkpoint=checkpoint)
+        first = next(run)
+        next(run)
+        state = checkpoint.load()
+        self.assertEqual(state['chunks'], 1)
+
+        resumed = list(self._sync(checkpoint=checkpoint))
+        removed = [e for ds in resumed for e in ds.removed]
+        added = [e for ds in resumed for e in ds.added]
+        self.assertTrue(all(e.natural_key > state['natural_key']
+                            for e in removed + added))
+        self.assertEqual(len(removed) + len(list(first.removed)), 5)
+        self.assertEqual(len(added) + len(list(first.added)), 5)
+        self.assertTrue(checkpoint.load() is None)
+
+    def test_digests(self):
+        import os
+        import tempfile
+        from importtools import DjangoWriter, FileRangeDigests
+        path = os.path.join(tempfile.mkdtemp(), 'digests')
+        digests = FileRangeDigests(path)
+        writer = DjangoWriter(TestModel, ['a', 'b'], ['x', 'y'])
+
+        for ds in self._sync(digests=digests):
+            writer.write(ds)
+        self.assertEqual(TestModel.objects.count(), 20)
+        self.assertTrue(len(digests.load()) > 1)
+
+        TestModel.objects.filter(a=2, b='b 24').update(y='changed')
+        # The destination changed behind the digests, so nothing is synced.
+        self.assertEqual(list(self._sync(digests=digests)), [])
+
+        digests.clear()
+        from importtools import SyncStatistics
+        stats = SyncStatistics()
+        changed = [
+            e for ds in self._sync(digests=digests, instrumentation=stats)
+            for e in ds.changed
+        ]
+        self.assertEqual([e.natural_key for e in changed], [(2, u'b 24')])
+        self.assertTrue(stats.chunks > 1)
+        self.assertEqual(stats.totals['changed'], 1)
+
+    def test_digests_with_checkpoint(self):
+        self.assertRaises(
+            ValueError, list, self._sync(checkpoint=object(), digests=object())
+        )
+
+
+class TestWriting(TestCase):
+    def setUp(self):
+        for c in range(20):
+            TestModel.objects.create(
+                a=c / 10,
+                b='b %s' % c,
+                x=bool(c % 2),
+                y='y %s' % c,
+            )
+
+    def tearDown(self):
+        TestModel.objects.all().delete()
+
+    def _get_target(self):
+        from importtools import DjangoWriter
+        return DjangoWriter
+
+    def _make_one(self, batch_size=3):
+        return self._get_target()(
+            TestModel, ['a', 'b'], ['x', 'y'], batch_size=batch_size
+        )
+
+    def _load(self, ImportableFactory=TestImportable):
+        from importtools import DjangoLoader, RecordingDataSet
+        l = DjangoLoader(TestModel, ['a', 'b'], ['x', 'y'])
+        return RecordingDataSet(
+            ImportableFactory(natural_key, **content)
+            for natural_key, content in l.load_all()
+        )
+
+    def test_pozitive_batch_size(self):
+        self.assertRaises(ValueError, self._make_one, 0)
+
+    def test_write(self):
+        ds = self._load()
+        source = []
+        for c in range(5, 25):
+            y = 'y %s' % c if c % 3 else 'changed %s' % c
+            source.append(
+                TestImportable((c / 10, 'b %s' % c), x=bool(c % 2), y=y)
+            )
+        ds.sync(source)
+        self._make_one().write(ds)
+
+        rows = TestModel.objects.order_by('a', 'b').values_list(
+            'a', 'b', 'x', 'y'
+        )
+        expected = sorted(
+            (e.natural_key + (e.x, e.y)) for e in source
+        )
+        self.assertEqual(sorted(rows), expected)
+        self.assertEqual(self._load(), ds)
+
+    def test_update_changed_fields(self):
+        ds = self._load(TestRecordingImportable)
+        source = [
+            TestRecordingImportable(
+                (c / 10, 'b %s' % c), x=bool(c % 2),
+                y='y %s' % c if c % 3 else 'changed %s' % c
+            )
+            for c in range(20)
+        ]
+        ds.sync(source)
+        # Only the changed columns are written, so concurrent changes of
+        # the other columns are kept.
+        TestModel.objects.filter(b='b 3').update(x=False)
+        self._make_one().write(ds)
+
+        rows = dict(
+            ((a, b), (x, y)) for a, b, x, y in
+            TestModel.objects.values_list('a', 'b', 'x', 'y')
+        )
+        self.assertEqual(rows[0, 'b 3'], (False, 'changed 3'))
+        self.assertEqual(rows[0, 'b 4'], (False, 'y 4'))
+        self.assertEqual(rows[1, 'b 12'], (False, 'changed 12'))
+
+    def test_update_synced_fields(self):
+        # Plain elements don't know their changes, the dataset records them.
+        ds = self._load()
+        ds.sync([
+            TestImportable(
+                (c / 10, 'b %s' % c), x=bool(c % 2),
+                y='y %s' % c if c % 3 else 'changed %s' % c
+            )
+            for c in range(20)
+        ])
+        TestModel.objects.filter(b='b 3').update(x=False)
+        self._make_one().write(ds)
+
+        rows = dict(
+            ((a, b), (x, y)) for a, b, x, y in
+            TestModel.objects.values_list('a', 'b', 'x', 'y')
+        )
+        self.assertEqual(rows[0, 'b 3'], (False, 'changed 3'))
+        self.assertEqual(rows[0, 'b 4'], (False, 'y 4'))
+
+    def test_update_single_query_per_batch(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        elements = [
+            TestImportable((c / 10, 'b %s' % c), x=True, y='new %s' % c)
+            for c in range(20)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            self._make_one(batch_size=10).update(elements)
+        updates = [q for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        rows = sorted(TestModel.objects.values_list('b', 'x', 'y'))
+        self.assertEqual(
+            rows, sorted(('b %s' % c, True, 'new %s' % c) for c in range(20))
+        )
+
+    def test_update_within_query_parameter_limit(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        for c in range(20, 450):
+            TestModel.objects.create(
+                a=c / 10, b='b %s' % c, x=False, y='y %s' % c,
+            )
+        elements = [
+            TestImportable((c / 10, 'b %s' % c), x=True, y='new %s' % c)
+            for c in range(450)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            self._make_one(batch_size=1000).update(elements)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertTrue(len(updates) > 1)
+        for sql in updates:
+            # A WHEN and a THEN parameter per field, a primary key per row.
+            whens = sql.count(' WHEN ')
+            self.assertTrue(2 * whens + whens // 2 <= 999)
+        self.assertEqual(TestModel.objects.filter(x=True).count(), 450)
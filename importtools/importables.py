@@ -20,7 +20,187 @@ video element lose any correspondence with elements belonging to other systems.
 
 """
 
-__all__ = ['Importable', 'RecordingImportable']
+import contextlib
+import cPickle as pickle
+import hashlib
+import keyword
+import marshal
+import operator
+import threading
+
+
+__all__ = [
+    'Importable', 'RecordingImportable', 'FrozenImportable',
+    'batched_notifications',
+]
+
+_magic_name = '__content_attrs__'
+
+_batches = threading.local()
+
+_unchanged = frozenset()
+
+
+def _dumps(value):
+    """Serialize *value* for digests, so different values differ.
+
+    Values are encoded with version 0 of ``marshal``, which has no string
+    references, or pickled if ``marshal`` can't encode them. Values that
+    can't be pickled either fall back to their ``repr``.
+
+    """
+    try:
+        return 'm' + marshal.dumps(value, 0)
+    except ValueError:
+        pass
+    try:
+        return 'p' + pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return 'r' + repr(value)
+
+
+@contextlib.contextmanager
+def batched_notifications():
+    """Hold back the change notifications and deliver them at the end.
+
+    While the context is active, the elements changed on the current thread
+    are collected instead of calling their listeners and trackers right away.
+    When it exits, every changed element is notified once, no matter how many
+    times it changed:
+
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a']
+    >>> notifications = []
+    >>> i = MockImportable(0, a=0)
+    >>> i.register(lambda x: notifications.append(x))
+    >>> with batched_notifications():
+    ...     i.a = 1
+    ...     i.a = 2
+    ...     print notifications
+    []
+    >>> notifications
+    [MockImportable(0, a=2)]
+
+    Listeners registered with ``batch=True`` are called once with the list
+    of all the changed elements they are registered on, see
+    :py:meth:`Importable.register`. Trackers can likewise implement
+    ``_register_changes`` to receive all their elements at once. Nested
+    contexts are delivered by the outermost one. ``DataSet.sync`` batches
+    the notifications of the elements it changes.
+
+    """
+    if getattr(_batches, 'current', None) is not None:
+        yield
+        return
+    batch = _batches.current = _NotificationBatch()
+    try:
+        yield
+    finally:
+        _batches.current = None
+        batch.deliver()
+
+
+class _NotificationBatch(object):
+
+    def __init__(self):
+        self._seen = set()
+        self._elements = []
+
+    def add(self, element):
+        key = id(element)
+        if key not in self._seen:
+            self._seen.add(key)
+            self._elements.append(element)
+
+    def deliver(self):
+        batch_listeners = {}
+        trackers = {}
+        for element in self._elements:
+            listeners = element._listeners
+            if listeners is not None:
+                for listener in listeners:
+                    if isinstance(listener, _BatchListener):
+                        batch_listeners.setdefault(
+                            listener.listener, []
+                        ).append(element)
+                    else:
+                        listener(element)
+            tracker = element._tracker
+            if tracker is not None:
+                tracker = tracker()
+                if tracker is not None:
+                    elements = trackers.setdefault(id(tracker), (tracker, []))
+                    elements[1].append(element)
+        for listener, elements in batch_listeners.iteritems():
+            listener(elements)
+        for tracker, elements in trackers.itervalues():
+            register_changes = getattr(tracker, '_register_changes', None)
+            if register_changes is not None:
+                register_changes(elements)
+            else:
+                for element in elements:
+                    tracker._register_change(element)
+
+
+class _BatchListener(object):
+    """Wrap a listener that takes a list of elements."""
+
+    __slots__ = ('listener',)
+
+    def __init__(self, listener):
+        self.listener = listener
+
+    def __call__(self, element):
+        self.listener([element])
+
+    def __eq__(self, other):
+        if isinstance(other, _BatchListener):
+            other = other.listener
+        return self.listener == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.listener)
+
+
+class _TrackerListener(object):
+    """Notify a tracker of an element that already has another one."""
+
+    __slots__ = ('tracker',)
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def __call__(self, element):
+        tracker = self.tracker()
+        if tracker is not None:
+            tracker._register_change(element)
+
+    def __eq__(self, other):
+        return (isinstance(other, _TrackerListener)
+                and self.tracker is other.tracker)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return id(self.tracker)
+
+
+def _get_content_attrs(d):
+    ca = d[_magic_name]
+    # XXX: py3
+    if isinstance(ca, basestring):
+        raise ValueError(
+                '%s must be an iterable not a string.' % _magic_name
+                )
+
+    try:
+        return frozenset(ca)
+    except TypeError:
+        raise ValueError('%s must be iterable.' % _magic_name)
 
 
 class _AutoContent(type):
@@ -38,32 +218,10 @@ class _AutoContent(type):
     """
 
     def __new__(cls, name, bases, d):
-        _magic_name = '__content_attrs__'
-
         if _magic_name not in d:
             return type.__new__(cls, name, bases, d)
 
-        ca = d[_magic_name]
-        # XXX: py3
-        if isinstance(ca, basestring):
-            raise ValueError(
-                    '%s must be an iterable not a string.' % _magic_name
-                    )
-
-        try:
-            ca = frozenset(ca)
-        except TypeError:
-            raise ValueError('%s must be iterable.' % _magic_name)
-
-        def __init__(self, *args, **kwargs):
-            update_kwargs = {}
-            for content_attr in self._content_attrs:
-                try:
-                    update_kwargs[content_attr] = kwargs.pop(content_attr)
-                except KeyError:
-                    pass  # All arguments are optional
-            self._update(update_kwargs)
-            super(klass, self).__init__(*args, **kwargs)
+        ca = _get_content_attrs(d)
 
         def __repr__(self):
             attrs = []
@@ -80,15 +238,189 @@ class _AutoContent(type):
                 )
             return super(klass, self).__repr__()
 
-        d['__init__'] = __init__
         d.setdefault('__repr__', __repr__)
         d['__slots__'] = frozenset(d.get('__slots__', [])) | ca
         d['_content_attrs'] = ca
 
         klass = type.__new__(cls, name, bases, d)
+
+        # The content attributes are fixed so the hot methods can be
+        # generated with the attribute names unrolled instead of looping
+        # over ``_content_attrs``. Methods defined by the class body or
+        # overridden by a base class win.
+        custom = dict(
+            (method_name, not _is_generic(klass, method_name, d))
+            for method_name in ('_update', '_sync')
+        )
+        methods = _generate_methods(klass, ca, custom['_update'])
+        klass.__init__ = methods['__init__']
+        for method_name in ('_update', '_sync'):
+            if not custom[method_name]:
+                setattr(klass, method_name, methods[method_name])
         return klass
 
 
+def _is_generic(klass, method_name, d):
+    """Check if *method_name* of *klass* can be replaced by generated code."""
+    if method_name in d:
+        return False
+    for base in klass.__mro__[1:]:
+        if method_name in base.__dict__:
+            method = base.__dict__[method_name]
+            return (
+                getattr(method, '_generated', False) or
+                method is Importable.__dict__[method_name]
+            )
+    return True
+
+
+def _generate_methods(klass, content_attrs, custom_update=False):
+    """Generate ``__init__``, ``_update`` and ``_sync`` for *klass*.
+
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a', 'b']
+    >>> i = MockImportable(0, a=1)
+    >>> i._update({'a': 1, 'b': 2})
+    frozenset(['b'])
+    >>> i._update({'a': 1, 'b': 2})
+    frozenset([])
+
+    Attributes that are not part of the content are still handled by the
+    generic implementation:
+
+    >>> class SubImportable(MockImportable):
+    ...     pass
+    >>> i = SubImportable(0)
+    >>> sorted(i._update({'a': 1, 'c': 3}))
+    ['a', 'c']
+    >>> i.a, i.c
+    (1, 3)
+
+    >>> o = Importable(1)
+    >>> i._sync(i._content_attrs, o)
+    frozenset([])
+    >>> i._sync(['c'], MockImportable(1))
+    frozenset([])
+
+    Empty content and attribute names that are Python keywords are
+    supported:
+
+    >>> class EmptyImportable(Importable):
+    ...     __content_attrs__ = []
+    >>> EmptyImportable(0)
+    EmptyImportable(0)
+    >>> class RangeImportable(Importable):
+    ...     __content_attrs__ = ['from', 'to']
+    >>> r = RangeImportable(0, **{'from': 1, 'to': 2})
+    >>> r.sync(RangeImportable(0, **{'from': 3}))
+    frozenset(['from'])
+    >>> getattr(r, 'from'), r.to
+    (3, 2)
+
+    If the class or one of its bases overrides ``_update``, the constructor
+    passes the content through it, when *custom_update* is true:
+
+    >>> class StrippedImportable(Importable):
+    ...     __content_attrs__ = ['a']
+    ...     def _update(self, attrs):
+    ...         attrs = dict((k, v.strip()) for k, v in attrs.items())
+    ...         return super(StrippedImportable, self)._update(attrs)
+    >>> StrippedImportable(1, a=' x ').a
+    'x'
+    >>> class SubImportable(StrippedImportable):
+    ...     __content_attrs__ = ['a', 'b']
+    >>> SubImportable(1, a=' x ', b=' y ')
+    SubImportable(1, a='x', b='y')
+
+    """
+    attrs = sorted(content_attrs)
+    init = [
+        'def __init__(self, *args, **kwargs):',
+    ]
+    if custom_update:
+        # The values are set before ``Importable.__init__`` runs, like the
+        # unrolled version does, so a ``digest`` argument is kept.
+        init.extend([
+            '    content = {}',
+            '    for attr in _content_attrs:',
+            '        if attr in kwargs:',
+            '            content[attr] = kwargs.pop(attr)',
+            '    self._update(content)',
+        ])
+    elif attrs:
+        init.append('    if kwargs:')
+    update = [
+        'def _update(self, attrs):',
+        '    changed = ()',
+        '    handled = 0',
+    ]
+    sync = [
+        'def _sync(self, content_attrs, other):',
+        '    if content_attrs is not _content_attrs:',
+        '        return super(klass, self)._sync(content_attrs, other)',
+        '    changed = ()',
+    ]
+    change = [
+        '        try:',
+        '            current = %(self_attr)s',
+        '        except AttributeError:',
+        '            current = _sentinel',
+        '        if current != value:',
+        '            self._before_change(%(name)r)',
+        '            _setattr(self, %(name)r, value)',
+        '            changed += (%(name)r,)',
+    ]
+    for attr in attrs:
+        names = {'name': attr}
+        if keyword.iskeyword(attr):
+            names['self_attr'] = 'getattr(self, %r)' % attr
+            names['other_attr'] = 'getattr(other, %r)' % attr
+        else:
+            names['self_attr'] = 'self.%s' % attr
+            names['other_attr'] = 'other.%s' % attr
+        if not custom_update:
+            init.append('        if %(name)r in kwargs:' % names)
+            init.append(
+                '            _setattr(self, %(name)r, kwargs.pop(%(name)r))'
+                % names
+            )
+        update.append('    if %(name)r in attrs:' % names)
+        update.append('        handled += 1')
+        update.append('        value = attrs[%(name)r]' % names)
+        update.extend(line % names for line in change)
+        sync.append('    try:')
+        sync.append('        value = %(other_attr)s' % names)
+        sync.append('    except AttributeError:')
+        sync.append('        pass')
+        sync.append('    else:')
+        sync.extend(line % names for line in change)
+    init.append('    super(klass, self).__init__(*args, **kwargs)')
+    update.extend([
+        '    if handled != len(attrs):',
+        '        others = dict(',
+        '            (k, v) for k, v in attrs.iteritems()',
+        '            if k not in _content_attrs',
+        '        )',
+        '        changed += tuple(super(klass, self)._update(others))',
+        '    return frozenset(changed) if changed else _unchanged',
+    ])
+    sync.append('    return frozenset(changed) if changed else _unchanged')
+
+    source = '\n'.join(init + [''] + update + [''] + sync) + '\n'
+    namespace = {
+        'klass': klass,
+        '_content_attrs': content_attrs,
+        '_sentinel': klass._sentinel,
+        '_setattr': object.__setattr__,
+        '_unchanged': _unchanged,
+    }
+    code = compile(source, '<generated %s>' % klass.__name__, 'exec')
+    exec(code, namespace)
+    for method_name in ('__init__', '_update', '_sync'):
+        namespace[method_name]._generated = True
+    return namespace
+
+
 class Importable(object):
     """A default implementation representing an importable element.
 
@@ -170,39 +502,114 @@ class Importable(object):
     >>> i.b = 2
     >>> i.a, i.b
     (1, 2)
-    >>> i.update(a=100, b=200)
-    True
+    >>> sorted(i.update(a=100, b=200))
+    ['a', 'b']
 
     """
 
     __metaclass__ = _AutoContent
-    __slots__ = ('_listeners', '_natural_key')
+    __slots__ = ('_listeners', '_tracker', '_natural_key', '_digest')
     _content_attrs = frozenset([])
     _sentinel = object()
 
     def __init__(self, natural_key, *args, **kwargs):
-        self._listeners = []
-        self._natural_key = natural_key
+        setattr_ = super(Importable, self).__setattr__
+        # The listeners list is only allocated on the first registration.
+        setattr_('_listeners', None)
+        setattr_('_tracker', None)
+        setattr_('_natural_key', natural_key)
+        setattr_('_digest', kwargs.pop('digest', None))
         super(Importable, self).__init__(*args, **kwargs)
 
     @property
     def natural_key(self):
         return self._natural_key
 
+    @property
+    def digest(self):
+        """A digest of the element content.
+
+        The digest is computed from the ``_content_attrs`` values on first
+        access and is cached until the content changes:
+
+        >>> class MockImportable(Importable):
+        ...     __content_attrs__ = ['a', 'b']
+        >>> i1, i2 = MockImportable(0, a=1), MockImportable(1, a=1)
+        >>> i1.digest == i2.digest
+        True
+        >>> i2.b = 2
+        >>> i1.digest == i2.digest
+        False
+
+        Loaders that already know the digest, for example because it's stored
+        alongside the data, can supply it with the ``digest`` keyword argument
+        or by assigning this property. When both elements have a digest
+        available, :py:meth:`sync` compares the digests and leaves the content
+        untouched if they are equal:
+
+        >>> i1 = MockImportable(0, a=1, digest='same')
+        >>> i2 = MockImportable(0, a=2, digest='same')
+        >>> i1.sync(i2), i1.a
+        (frozenset([]), 1)
+
+        Digests are only compared with each other, so a loader supplying them
+        must compute the digests of both sides in the same way.
+
+        The values are serialized with ``marshal``, or ``pickle`` for the
+        values it can't encode, so values that merely look the same differ:
+
+        >>> MockImportable(0, a=1).digest == MockImportable(0, a=1L).digest
+        False
+
+        Only values that can't be pickled are compared by ``repr``, which
+        must then tell different values apart.
+
+        """
+        digest = self._digest
+        if digest is None:
+            digest = self._compute_digest()
+            super(Importable, self).__setattr__('_digest', digest)
+        return digest
+
+    @digest.setter
+    def digest(self, value):
+        super(Importable, self).__setattr__('_digest', value)
+
+    def _compute_digest(self):
+        sentinel = self._sentinel
+        content = []
+        for attr_name in sorted(self._content_attrs):
+            value = getattr(self, attr_name, sentinel)
+            if value is not sentinel:
+                content.append((attr_name, value))
+        return hashlib.sha1(_dumps(content)).hexdigest()
+
     def __setattr__(self, attr, value):
         is_different = False
         if attr in self._content_attrs:
             is_different = getattr(self, attr, object()) != value
+            if is_different:
+                self._before_change(attr)
         super(Importable, self).__setattr__(attr, value)
         if is_different:
             self._notify()
 
+    def __delattr__(self, attr):
+        if attr in self._content_attrs and hasattr(self, attr):
+            self._before_change(attr)
+        super(Importable, self).__delattr__(attr)
+
+    def _before_change(self, attr_name):
+        """Called every time before a content attribute value is changed."""
+        super(Importable, self).__setattr__('_digest', None)
+
     def update(self, **kwargs):
         """Update multiple content attrtibutes and fire a single notification.
 
         Multiple changes to the element content can be grouped in a single call
-        to :py:meth:`update`. This method should return ``True`` if at least
-        one element differed from the original values or else ``False``.
+        to :py:meth:`update`. This method should return a ``frozenset`` with
+        the names of the attributes that differed from the original values.
+        It's empty, and so false, if nothing changed.
 
         >>> class MockImportable(Importable):
         ...     _content_attrs = ['a', 'b']
@@ -210,15 +617,15 @@ class Importable(object):
         >>> i.register(lambda x: notifications.append(x))
 
         >>> notifications = []
-        >>> i.update(a=100, b=200)
-        True
+        >>> sorted(i.update(a=100, b=200))
+        ['a', 'b']
         >>> len(notifications)
         1
         >>> notifications[0] is i
         True
         >>> notifications = []
         >>> i.update(a=100, b=200)
-        False
+        frozenset([])
         >>> len(notifications)
         0
 
@@ -243,16 +650,16 @@ class Importable(object):
         return has_changed
 
     def _update(self, attrs):
-        has_changed = False
+        changed = []
+        sentinel = self._sentinel
         super_ = super(Importable, self)
-        for attr_name, value in attrs.items():
-            if not has_changed:
-                current_value = getattr(self, attr_name, self._sentinel)
-                # object() sentinel will also be different
-                if current_value != value:
-                    has_changed = True
-            super_.__setattr__(attr_name, value)
-        return has_changed
+        for attr_name, value in attrs.iteritems():
+            # The sentinel will also be different
+            if getattr(self, attr_name, sentinel) != value:
+                self._before_change(attr_name)
+                super_.__setattr__(attr_name, value)
+                changed.append(attr_name)
+        return frozenset(changed) if changed else _unchanged
 
     def sync(self, other):
         """Puts this element in sync with the *other*.
@@ -288,15 +695,16 @@ class Importable(object):
         >>> i1.a, i1.b
         ('a2', 'b2')
 
-        If no synchronization was needed (i.e. the content of the elements were
-        equal) this method should return ``False``, otherwise it should return
-        ``True``:
+        Just like :py:meth:`update`, this method returns a ``frozenset`` with
+        the names of the changed attributes, which is empty if no
+        synchronization was needed (i.e. the content of the elements were
+        equal):
 
         >>> i1.sync(i2)
-        False
+        frozenset([])
         >>> i1.a = 'a1'
         >>> i1.sync(i2)
-        True
+        frozenset(['a'])
 
         If the sync mutated this element all listeners should be notified. See
         :py:meth:`register`:
@@ -318,6 +726,9 @@ class Importable(object):
         False
 
         """
+        digest = self._digest
+        if digest is not None and digest == getattr(other, '_digest', None):
+            return _unchanged
         has_changed = self._sync(self._content_attrs, other)
         if has_changed:
             self._notify()
@@ -334,7 +745,7 @@ class Importable(object):
                 attrs[attr] = that
         return self._update(attrs)
 
-    def register(self, listener):
+    def register(self, listener, batch=False):
         """Register a callable to be notified when ``sync`` changes data.
 
         This method should raise an ``ValueError`` if *listener* is not a
@@ -355,9 +766,24 @@ class Importable(object):
         >>> notifications[0] is notifications[1] is i
         True
 
+        If *batch* is true the listener is called with a list of elements
+        instead. Outside of :py:func:`batched_notifications` the list holds
+        just this element:
+
+        >>> i = Importable(0)
+        >>> i.register(lambda elements: notifications.append(elements),
+        ...            batch=True)
+        >>> i._notify()
+        >>> notifications[-1]
+        [Importable(0)]
+
         """
         if not callable(listener):
             raise ValueError('Listener is not callable: %s' % listener)
+        if batch:
+            listener = _BatchListener(listener)
+        if self._listeners is None:
+            super(Importable, self).__setattr__('_listeners', [])
         self._listeners.append(listener)
 
     def is_registered(self, listener):
@@ -372,12 +798,98 @@ class Importable(object):
         True
 
         """
-        return listener in self._listeners
+        return self._listeners is not None and listener in self._listeners
+
+    def _track(self, tracker):
+        """Set a weak reference to the object tracking changes of this element.
+
+        Unlike listeners, an element has at most one tracker and setting it
+        takes constant time. When the element changes, the tracker's
+        ``_register_change`` method is called with the element. Since only a
+        weak reference is kept, the element doesn't keep the tracker alive:
+
+        >>> import weakref
+        >>> class Tracker(object):
+        ...     def _register_change(self, element):
+        ...         print 'changed', element
+        >>> t = Tracker()
+        >>> i = Importable(0)
+        >>> i._track(weakref.ref(t))
+        >>> i._notify()
+        changed Importable(0)
+        >>> del t
+        >>> i._notify()
+
+        If the element already has another live tracker, the new one is
+        registered as a listener instead, so both are notified:
+
+        >>> t1, t2 = Tracker(), Tracker()
+        >>> i._track(weakref.ref(t1))
+        >>> i._track(weakref.ref(t2))
+        >>> i._notify()
+        changed Importable(0)
+        changed Importable(0)
+
+        """
+        current = self._tracker
+        if (current is not None and current is not tracker
+                and current() is not None):
+            listener = _TrackerListener(tracker)
+            if not self.is_registered(listener):
+                self.register(listener)
+            return
+        super(Importable, self).__setattr__('_tracker', tracker)
 
     def _notify(self):
         """Sends a notification to all listeners passing this element."""
-        for listener in self._listeners:
-            listener(self)
+        batch = getattr(_batches, 'current', None)
+        if batch is not None:
+            batch.add(self)
+            return
+        if self._listeners is not None:
+            for listener in self._listeners:
+                listener(self)
+        tracker = self._tracker
+        if tracker is not None:
+            tracker = tracker()
+            if tracker is not None:
+                tracker._register_change(self)
+
+    def __getstate__(self):
+        """Return the natural key and the content of this element.
+
+        Listeners are not part of the state so unpickled elements start with
+        none registered:
+
+        >>> import pickle
+        >>> i = Importable((1, 'a'))
+        >>> i.register(lambda x: None)
+        >>> c = pickle.loads(pickle.dumps(i, pickle.HIGHEST_PROTOCOL))
+        >>> c, c.is_registered(i._listeners[0])
+        (Importable((1, 'a')), False)
+
+        The same goes for the tracker, see :py:meth:`_track`.
+
+        """
+        state = {}
+        for attr in self._content_attrs:
+            try:
+                state[attr] = getattr(self, attr)
+            except AttributeError:
+                pass
+        state.update(getattr(self, '__dict__', ()))
+        state['_natural_key'] = self._natural_key
+        if self._digest is not None:
+            state['_digest'] = self._digest
+        return state
+
+    def __setstate__(self, state):
+        setattr_ = super(Importable, self).__setattr__
+        setattr_('_listeners', None)
+        setattr_('_tracker', None)
+        setattr_('_digest', None)
+        for attr, value in state.iteritems():
+            setattr_(attr, value)
 
     def __hash__(self):
         return hash(self._natural_key)
@@ -418,11 +930,268 @@ class Importable(object):
         return '%s(%r)' % (cls_name, self._natural_key)
 
 
-class _Original(Importable):
+class _MissingType(object):
+    """Marks a content attribute without value in a frozen element."""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return '_missing'
+
+    def __repr__(self):
+        return '<missing>'
+
+
+_missing = _MissingType()
+
 
-    def copy(self, content_attrs, other):
-        self.__dict__.clear()
-        self._sync(content_attrs, other)
+def _frozen_getter(index, attr_name):
+    def getter(self):
+        value = tuple.__getitem__(self, index)
+        if value is _missing:
+            raise AttributeError(attr_name)
+        return value
+    return property(getter)
+
+
+def _make_frozen(cls, values):
+    return tuple.__new__(cls, values)
+
+
+class _FrozenContent(type):
+    """
+    >>> class MockImportable(FrozenImportable):
+    ...     __content_attrs__ = 'attr' # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ValueError:
+
+    Subclasses extend the content of their parents:
+
+    >>> class MockImportable(FrozenImportable):
+    ...     __content_attrs__ = ['b', 'a']
+    >>> class SubImportable(MockImportable):
+    ...     __content_attrs__ = ['c']
+    >>> SubImportable._fields
+    ('a', 'b', 'c')
+    >>> SubImportable(0, a=1, c=3)
+    SubImportable(0, a=1, c=3)
+
+    """
+
+    def __new__(cls, name, bases, d):
+        d.setdefault('__slots__', ())
+        if _magic_name not in d:
+            return type.__new__(cls, name, bases, d)
+
+        ca = _get_content_attrs(d)
+        fields = []
+        for base in bases:
+            for attr_name in getattr(base, '_fields', ()):
+                if attr_name not in fields:
+                    fields.append(attr_name)
+        fields.extend(sorted(ca.difference(fields)))
+
+        for index, attr_name in enumerate(fields, 1):
+            d[attr_name] = _frozen_getter(index, attr_name)
+        d['_fields'] = tuple(fields)
+        d['_content_attrs'] = frozenset(fields)
+        return type.__new__(cls, name, bases, d)
+
+
+class FrozenImportable(tuple):
+    """An immutable, lightweight element meant to be used as a sync source.
+
+    Source elements are only read and compared while syncing, so they don't
+    need the listeners machinery of :py:class:`Importable`. Instances of this
+    class are tuples holding the natural key followed by the content values.
+    They are hashable and comparable based on the *natural_key* value exactly
+    like ``Importable`` elements so they can be mixed with them:
+
+    >>> class MockImportable(FrozenImportable):
+    ...     __content_attrs__ = ['a', 'b']
+    >>> f = MockImportable(0, a=1)
+    >>> f
+    MockImportable(0, a=1)
+    >>> f.natural_key, f.a
+    (0, 1)
+    >>> hasattr(f, 'b')
+    False
+    >>> f == Importable(0), Importable(0) == f, f != Importable(0)
+    (True, True, False)
+    >>> f < Importable(1), Importable(1) > f
+    (True, True)
+    >>> hash(f) == hash(Importable(0))
+    True
+    >>> f.a = 2 # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    AttributeError:
+
+    The content attributes are defined with ``__content_attrs__`` just like
+    for ``Importable`` and they can be passed as keyword arguments. Unknown
+    keyword arguments raise ``TypeError``:
+
+    >>> MockImportable(0, c=1) # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    TypeError:
+
+    Frozen elements can be used as the source of a sync:
+
+    >>> from importtools import RecordingDataSet
+    >>> class DestImportable(Importable):
+    ...     __content_attrs__ = ['a', 'b']
+    >>> rds = RecordingDataSet([DestImportable(0, a=0, b=0)])
+    >>> rds.sync([MockImportable(0, a=1), MockImportable(1, b=1)])
+    SyncSummary(added=1, removed=0, changed=1)
+    >>> rds
+    RecordingDataSet([DestImportable(0, a=1, b=0), MockImportable(1, b=1)])
+    >>> list(rds.changed)
+    [DestImportable(0, a=1, b=0)]
+
+    Since they never change, registering listeners is accepted but has no
+    effect. Frozen elements that end up in a destination dataset can't be
+    synced in place later on.
+
+    >>> import pickle
+    >>> f = FrozenImportable((1, 'a'))
+    >>> pickle.loads(pickle.dumps(f, pickle.HIGHEST_PROTOCOL)) == f
+    True
+
+    """
+
+    __metaclass__ = _FrozenContent
+    __slots__ = ()
+    _fields = ()
+    _content_attrs = frozenset([])
+
+    def __new__(cls, natural_key, **kwargs):
+        values = [natural_key]
+        for attr_name in cls._fields:
+            values.append(kwargs.pop(attr_name, _missing))
+        if kwargs:
+            raise TypeError(
+                'Unexpected content attributes: %s' % ', '.join(kwargs)
+            )
+        return tuple.__new__(cls, values)
+
+    natural_key = property(operator.itemgetter(0))
+
+    def __reduce__(self):
+        return _make_frozen, (self.__class__, tuple(self))
+
+    def register(self, listener):
+        if not callable(listener):
+            raise ValueError('Listener is not callable: %s' % listener)
+
+    def is_registered(self, listener):
+        return False
+
+    def _track(self, tracker):
+        pass
+
+    def __hash__(self):
+        return hash(tuple.__getitem__(self, 0))
+
+    def __eq__(self, other):
+        try:
+            return tuple.__getitem__(self, 0) == other.natural_key
+        except AttributeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __lt__(self, other):
+        try:
+            return tuple.__getitem__(self, 0) < other.natural_key
+        except AttributeError:
+            return NotImplemented
+
+    def __le__(self, other):
+        try:
+            return tuple.__getitem__(self, 0) <= other.natural_key
+        except AttributeError:
+            return NotImplemented
+
+    def __gt__(self, other):
+        try:
+            return tuple.__getitem__(self, 0) > other.natural_key
+        except AttributeError:
+            return NotImplemented
+
+    def __ge__(self, other):
+        try:
+            return tuple.__getitem__(self, 0) >= other.natural_key
+        except AttributeError:
+            return NotImplemented
+
+    def __repr__(self):
+        attrs = []
+        for attr_name, value in zip(self._fields, self[1:]):
+            if value is not _missing:
+                attrs.append('%s=%r' % (attr_name, value))
+        cls_name = self.__class__.__name__
+        if attrs:
+            return '%s(%r, %s)' % (
+                cls_name, tuple.__getitem__(self, 0), ', '.join(attrs)
+            )
+        return '%s(%r)' % (cls_name, tuple.__getitem__(self, 0))
+
+
+class _Original(object):
+    """A read only view of the original content of a RecordingImportable."""
+
+    __slots__ = ('_element', )
+
+    def __init__(self, element):
+        self._element = element
+
+    @property
+    def natural_key(self):
+        return self._element.natural_key
+
+    def __getattr__(self, attr_name):
+        # Called for unset slots and special methods looked up by copy and
+        # pickle, too, before the element is known.
+        if attr_name == '_element' or attr_name.startswith('__'):
+            raise AttributeError(attr_name)
+        element = self._element
+        if attr_name not in element._content_attrs:
+            raise AttributeError(attr_name)
+        original = element._original
+        if original is not None and attr_name in original:
+            value = original[attr_name]
+            if value is _missing:
+                raise AttributeError(attr_name)
+            return value
+        return getattr(element, attr_name)
+
+    def __reduce__(self):
+        return _Original, (self._element,)
+
+    def __hash__(self):
+        return hash(self.natural_key)
+
+    def __eq__(self, other):
+        try:
+            return self.natural_key == other.natural_key
+        except AttributeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __lt__(self, other):
+        try:
+            return self.natural_key < other.natural_key
+        except AttributeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return '_Original(%r)' % (self.natural_key,)
 
 
 class RecordingImportable(Importable):
@@ -448,8 +1217,8 @@ class RecordingImportable(Importable):
     >>> i.b = 2
     >>> i.a, i.b
     (1, 2)
-    >>> i.update(a=100, b=200)
-    True
+    >>> sorted(i.update(a=100, b=200))
+    ['a', 'b']
     >>> i.orig.a
     1
 
@@ -459,9 +1228,26 @@ class RecordingImportable(Importable):
 
     def __init__(self, *args, **kwargs):
         super(RecordingImportable, self).__init__(*args, **kwargs)
-        self._original = _Original(self.natural_key)
         self.reset()
 
+    def _before_change(self, attr_name):
+        # The original values are captured lazily, only for the attributes
+        # that are changed and only on their first change after a reset.
+        super(RecordingImportable, self)._before_change(attr_name)
+        original = getattr(self, '_original', None)
+        if original is None:
+            original = {}
+            super(RecordingImportable, self).__setattr__(
+                '_original', original
+            )
+        if attr_name not in original:
+            original[attr_name] = getattr(self, attr_name, _missing)
+
+    def __getstate__(self):
+        state = super(RecordingImportable, self).__getstate__()
+        state['_original'] = self._original
+        return state
+
     @property
     def orig(self):
         """An object that can be used to access the elements original values.
@@ -488,12 +1274,54 @@ class RecordingImportable(Importable):
         >>> i.orig.a
         'a'
         >>> del i.a
+        >>> i.orig.a
+        'a'
         >>> i.reset()
         >>> hasattr(i.orig, 'a')
         False
 
+        Like the element, the view is identified by the natural key:
+
+        >>> import pickle
+        >>> i.orig
+        _Original(0)
+        >>> i.orig == i, hash(i.orig) == hash(i)
+        (True, True)
+        >>> pickle.loads(pickle.dumps(RecordingImportable(1).orig, 2))
+        _Original(1)
+
+        """
+        return _Original(self)
+
+    @property
+    def changed_attrs(self):
+        """The names of the attributes that differ from the original values.
+
+        >>> class MockImportable(RecordingImportable):
+        ...     __content_attrs__ = ['a', 'b']
+        >>> i = MockImportable(0, a=1, b=1)
+        >>> i.changed_attrs
+        frozenset([])
+        >>> i.update(a=2, b=2)
+        frozenset(['a', 'b'])
+        >>> i.b = 1
+        >>> i.changed_attrs
+        frozenset(['a'])
+        >>> i.reset()
+        >>> i.changed_attrs
+        frozenset([])
+
+        Attributes that were changed back to their original values are not
+        included, so writers can persist only the attributes that changed.
+
         """
-        return self._original
+        original = self._original
+        if not original:
+            return _unchanged
+        return frozenset(
+            attr_name for attr_name, value in original.iteritems()
+            if getattr(self, attr_name, _missing) != value
+        )
 
     def reset(self):
         """Create a snapshot of the current values.
@@ -513,5 +1341,11 @@ class RecordingImportable(Importable):
         >>> i.orig.a
         'aa'
 
+        Nothing is copied, the original values are only captured when the
+        attributes change afterwards:
+
+        >>> i._original is None
+        True
+
         """
-        self._original.copy(self._content_attrs, self)
+        super(RecordingImportable, self).__setattr__('_original', None)
@@ -0,0 +1,132 @@
+"""This module contains the instrumentation hooks for chunked imports.
+
+Passing a :py:class:`SyncInstrumentation` to ``chunked_mem_sync`` reports
+what every chunk did and where the time went, without wrapping the import in
+ad-hoc timers. :py:class:`SyncStatistics` is the default implementation and
+collects per-chunk and cumulative numbers.
+
+"""
+
+import abc
+import json
+import sys
+
+
+__all__ = ['SyncInstrumentation', 'SyncStatistics']
+
+
+class SyncInstrumentation(object):
+    """An ``abc`` for objects observing the progress of chunked imports.
+
+    The statistics of each chunk are passed as a ``dict`` with the keys:
+
+    * ``chunk``: the index of the chunk, starting from 0.
+    * ``source``, ``destination``: the number of elements loaded from each
+      side. Their sum is the number of ``merged`` elements.
+    * ``added``, ``removed``, ``changed``: the number of elements added,
+      removed and changed by the sync, as reported by the ``SyncSummary`` it
+      returns. For datasets returning something else, the number of elements
+      recorded by the dataset, if it records them.
+    * ``load_time``: seconds spent loading and merging the chunk.
+    * ``diff_time``: seconds spent syncing the chunk or, when a process pool
+      is used, waiting for its result.
+    * ``yield_time``: seconds spent by the consumer before asking for the next
+      chunk.
+
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def chunk_synced(self, stats):
+        """Called after the consumer is done with a chunk."""
+
+    @abc.abstractmethod
+    def finished(self):
+        """Called once the import has stopped."""
+
+
+class SyncStatistics(SyncInstrumentation):
+    """Collect the statistics of a chunked import.
+
+    If a *jsonl* stream is given, the statistics of every chunk and the final
+    summary are written to it as JSON lines.
+
+    >>> from StringIO import StringIO
+    >>> from importtools import Importable, chunked_mem_sync
+    >>> stats = SyncStatistics(jsonl=StringIO())
+    >>> source = [Importable(i) for i in range(0, 10, 2)]
+    >>> destination = [Importable(i) for i in range(0, 10, 3)]
+    >>> for ds in chunked_mem_sync(source, destination, hint=4,
+    ...                            instrumentation=stats):
+    ...     pass
+    >>> s = stats.summary()
+    >>> s['chunks'], s['merged'], s['added'], s['removed'], s['changed']
+    (3, 9, 3, 2, 0)
+    >>> s['peak_chunk_size']
+    4
+    >>> len(stats.jsonl.getvalue().splitlines())
+    4
+
+    The counts come from the result of the dataset ``sync``, so datasets
+    that don't record the changes are counted too:
+
+    >>> from importtools import SimpleDataSet
+    >>> stats = SyncStatistics()
+    >>> for ds in chunked_mem_sync(source, destination, SimpleDataSet,
+    ...                            hint=4, instrumentation=stats):
+    ...     pass
+    >>> s = stats.summary()
+    >>> s['added'], s['removed'], s['changed']
+    (3, 2, 0)
+
+    """
+
+    _counters = (
+        'merged', 'source', 'destination', 'added', 'removed', 'changed',
+        'load_time', 'diff_time', 'yield_time',
+    )
+
+    def __init__(self, jsonl=None):
+        self.jsonl = jsonl
+        self.chunks = 0
+        self.peak_chunk_size = 0
+        self.totals = dict.fromkeys(self._counters, 0)
+
+    def chunk_synced(self, stats):
+        stats = dict(stats)
+        stats['merged'] = stats['source'] + stats['destination']
+        self.chunks += 1
+        self.peak_chunk_size = max(self.peak_chunk_size, stats['merged'])
+        for counter in self._counters:
+            self.totals[counter] += stats.get(counter, 0)
+        self._write('chunk', stats)
+
+    def finished(self):
+        self._write('summary', self.summary())
+
+    def summary(self):
+        """Return the cumulative statistics as a ``dict``."""
+        summary = dict(self.totals)
+        summary['chunks'] = self.chunks
+        summary['peak_chunk_size'] = self.peak_chunk_size
+        return summary
+
+    def write_summary(self, stream=None):
+        """Write a human readable summary to *stream*, by default stdout."""
+        if stream is None:
+            stream = sys.stdout
+        summary = self.summary()
+        stream.write(
+            '%(chunks)d chunks, %(merged)d elements merged '
+            '(peak chunk size %(peak_chunk_size)d)\n'
+            '%(added)d added, %(removed)d removed, %(changed)d changed\n'
+            'load %(load_time).3fs, diff %(diff_time).3fs, '
+            'yield %(yield_time).3fs\n' % summary
+        )
+
+    def _write(self, kind, stats):
+        if self.jsonl is None:
+            return
+        record = dict(stats, type=kind)
+        self.jsonl.write(json.dumps(record, sort_keys=True) + '\n')
@@ -0,0 +1,154 @@
+"""This module contains a compact binary file format for elements.
+
+A snapshot stores the natural keys and the content of ``Importable``
+elements, for example those of a :py:class:`DataSet`, so they can be shipped
+to other processes or cached between runs instead of loading them from the
+destination system again. The file starts with a header listing the content
+attributes, followed by one packed row per element:
+
+* a 4 byte little endian length and a 1 byte encoding tag;
+* the ``marshal`` encoded ``(natural_key, present, values)`` tuple, where
+  *present* is a bit mask of the content attributes the element has and
+  *values* holds their values in the header order.
+
+Values that ``marshal`` can't encode, like ``datetime`` instances, make the
+row fall back to ``pickle`` and the tag records which one was used.
+
+"""
+
+import cPickle as pickle
+import marshal
+import mmap
+import operator
+import struct
+
+
+__all__ = ['write_snapshot', 'read_snapshot']
+
+_MAGIC = 'IMPORTTOOLS-SNAPSHOT\n'
+_VERSION = 1
+_ROW = struct.Struct('<Ic')
+_MARSHAL, _PICKLE = 'm', 'p'
+
+
+def write_snapshot(elements, path, content_attrs=None):
+    """Write the *elements* to a snapshot file at *path*.
+
+    The elements are written in natural key order and the number of elements
+    written is returned. By default the content attributes are those of the
+    first element:
+
+    >>> import os, tempfile
+    >>> from importtools import Importable, SimpleDataSet
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a', 'b']
+    >>> path = os.path.join(tempfile.mkdtemp(), 'destination.snapshot')
+    >>> ds = SimpleDataSet([MockImportable((2, 'x'), a=2, b=u'b'),
+    ...                     MockImportable((1, 'y'), a=1)])
+    >>> write_snapshot(ds, path)
+    2
+    >>> list(read_snapshot(path, MockImportable))
+    [MockImportable((1, 'y'), a=1), MockImportable((2, 'x'), a=2, b=u'b')]
+
+    Only the natural keys and the content are stored, listeners, trackers
+    and recorded changes are not.
+
+    """
+    elements = sorted(elements, key=operator.attrgetter('natural_key'))
+    if content_attrs is None:
+        content_attrs = elements[0]._content_attrs if elements else ()
+    attrs = sorted(content_attrs)
+    header = marshal.dumps({'version': _VERSION, 'content_attrs': attrs})
+    missing = object()
+    with open(path, 'wb') as f:
+        f.write(_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for element in elements:
+            present = 0
+            values = []
+            for bit, attr in enumerate(attrs):
+                value = getattr(element, attr, missing)
+                if value is not missing:
+                    present |= 1 << bit
+                    values.append(value)
+            row = element.natural_key, present, tuple(values)
+            try:
+                data, tag = marshal.dumps(row), _MARSHAL
+            except ValueError:
+                data = pickle.dumps(row, pickle.HIGHEST_PROTOCOL)
+                tag = _PICKLE
+            f.write(_ROW.pack(len(data), tag))
+            f.write(data)
+    return len(elements)
+
+
+def read_snapshot(path, ImportableFactory):
+    """Iterate over the elements stored in the snapshot file at *path*.
+
+    The file is memory mapped and the elements are built with
+    *ImportableFactory* one at a time, as they are consumed. Since they come
+    in natural key order, a snapshot can be passed directly to
+    ``chunked_loader`` or ``chunked_mem_sync``, or loaded in any
+    :py:class:`DataSet`.
+
+    A `ValueError` should be raised if the file is not a snapshot or if its
+    content attributes are not content attributes of *ImportableFactory*:
+
+    >>> import os, tempfile
+    >>> from importtools import Importable
+    >>> class MockImportable(Importable):
+    ...     __content_attrs__ = ['a']
+    >>> path = os.path.join(tempfile.mkdtemp(), 'destination.snapshot')
+    >>> write_snapshot([MockImportable(0, a=0)], path)
+    1
+    >>> list(read_snapshot(path, Importable))
+    ... # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ValueError:
+
+    """
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        offset = len(_MAGIC)
+        if data[:offset] != _MAGIC:
+            raise ValueError('Not a snapshot file: %s' % path)
+        size, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        header = marshal.loads(data[offset:offset + size])
+        offset += size
+        if header['version'] != _VERSION:
+            raise ValueError(
+                'Unsupported snapshot version: %s' % header['version']
+            )
+        attrs = header['content_attrs']
+        unknown = set(attrs) - set(ImportableFactory._content_attrs)
+        if unknown:
+            raise ValueError(
+                'Attributes %s are not part of the element content.'
+                % ', '.join(sorted(unknown))
+            )
+        complete = (1 << len(attrs)) - 1
+        end = len(data)
+        row_size = _ROW.size
+        while offset < end:
+            size, tag = _ROW.unpack_from(data, offset)
+            offset += row_size
+            row = data[offset:offset + size]
+            offset += size
+            if tag == _MARSHAL:
+                natural_key, present, values = marshal.loads(row)
+            else:
+                natural_key, present, values = pickle.loads(row)
+            if present == complete:
+                content = dict(zip(attrs, values))
+            else:
+                values = iter(values)
+                content = {}
+                for bit, attr in enumerate(attrs):
+                    if present & (1 << bit):
+                        content[attr] = next(values)
+            yield ImportableFactory(natural_key, **content)
+    finally:
+        data.close()
@@ -0,0 +1,187 @@
+"""This module contains helpers for sources that don't fit in memory.
+
+Chunked imports need both sides ordered by natural key. When a source comes
+unordered, for example from a CSV dump or a paginated API, it can be sorted
+with :py:func:`external_sort` and fed to ``chunked_loader`` or
+``chunked_mem_sync`` instead of syncing everything in memory. Alternatively,
+``partitioned_mem_sync`` splits both sides in buckets by hash, without
+sorting them.
+
+"""
+
+import cPickle as pickle
+import heapq
+import itertools
+import tempfile
+
+
+__all__ = ['external_sort']
+
+_BATCH_SIZE = 1024
+
+
+def external_sort(iterable, run_size=100000, key=None, tempdir=None,
+                  fan_in=64):
+    """Iterate over *iterable* in sorted order using bounded memory.
+
+    The elements are read in runs of at most *run_size* elements. Each run is
+    sorted in memory and appended to an anonymous temporary file in *tempdir*
+    and, once everything is read, the runs are merged in a single ordered
+    stream. If everything fits in a single run nothing is written to disk.
+    ``Importable`` instances sort by natural key so they can be sorted as they
+    are:
+
+    >>> from importtools import Importable
+    >>> source = [Importable(i) for i in (5, 3, 8, 1, 9, 2, 7)]
+    >>> list(external_sort(source, run_size=3))
+    [Importable(1), Importable(2), Importable(3), Importable(5), Importable(7), Importable(8), Importable(9)]
+
+    At most *fan_in* runs are merged at a time. When there are more runs,
+    they are merged in groups into longer runs, over as many passes as
+    needed. The runs are read
+    back in batches of ``run_size / fan_in`` elements, so about *run_size*
+    elements are held in memory while merging too:
+
+    >>> list(external_sort(range(10, 0, -1), run_size=2, fan_in=2))
+    [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+
+    The elements must be picklable. Like for ``sorted``, a *key* function can
+    be given and the sort is stable:
+
+    >>> list(external_sort(['bb', 'a', 'cc', 'b', 'aa'], run_size=2, key=len))
+    ['a', 'b', 'bb', 'cc', 'aa']
+    >>> list(external_sort(['bb', 'a', 'cc', 'b', 'aa'], run_size=1, key=len,
+    ...                    fan_in=2))
+    ['a', 'b', 'bb', 'cc', 'aa']
+
+    The result plugs straight into the chunked imports:
+
+    >>> from importtools import chunked_mem_sync
+    >>> destination = [Importable(i) for i in range(0, 10, 3)]
+    >>> for ds in chunked_mem_sync(external_sort(source, run_size=3),
+    ...                            destination, hint=6):
+    ...     print sorted(ds.added), sorted(ds.removed)
+    [Importable(1), Importable(2), Importable(5)] [Importable(0)]
+    [Importable(7), Importable(8)] [Importable(6)]
+
+    Listeners and trackers registered on the elements are not kept, just like
+    when pickling them. The temporary files are removed when the returned
+    iterator is exhausted, closed or garbage collected.
+
+    """
+    run_size = int(run_size)
+    if run_size <= 0:
+        raise ValueError('Run size must be positive.')
+    fan_in = int(fan_in)
+    if fan_in < 2:
+        raise ValueError('Fan in must be at least 2.')
+    batch_size = max(run_size // fan_in, 1)
+    iterator = iter(iterable)
+    # All the runs are written one after the other in the same file and
+    # are read back by offset, so only two files are ever open.
+    files = []
+    runs = []
+    try:
+        while True:
+            run = list(itertools.islice(iterator, run_size))
+            run.sort(key=key)
+            if not runs and len(run) < run_size:
+                # Everything fits in memory.
+                for element in run:
+                    yield element
+                return
+            if not run:
+                break
+            if not files:
+                files.append(tempfile.TemporaryFile(dir=tempdir))
+            runs.append(_spill(run, files[-1], batch_size))
+            del run
+        while len(runs) > fan_in:
+            # Merging consecutive runs keeps the sort stable.
+            f = files[-1]
+            files.append(tempfile.TemporaryFile(dir=tempdir))
+            runs = [
+                _spill(
+                    _merge(f, runs[start:start + fan_in], key),
+                    files[-1], batch_size,
+                )
+                for start in xrange(0, len(runs), fan_in)
+            ]
+            files.pop(0).close()
+        if runs:
+            for element in _merge(files[-1], runs, key):
+                yield element
+    finally:
+        for f in files:
+            f.close()
+
+
+def _merge(f, runs, key):
+    streams = [_read_span(f, start, end) for start, end in runs]
+    if key is None:
+        return heapq.merge(*streams)
+    # The run index and position keep the merge stable and make sure the
+    # elements themselves are never compared.
+    streams = [_decorate(s, index, key) for index, s in enumerate(streams)]
+    return (e for k, i, p, e in heapq.merge(*streams))
+
+
+def _spill(elements, f, batch_size):
+    """Append *elements* to *f* in batches and return their offsets."""
+    f.seek(0, 2)
+    start = f.tell()
+    elements = iter(elements)
+    while True:
+        batch = list(itertools.islice(elements, batch_size))
+        if not batch:
+            break
+        pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+    return start, f.tell()
+
+
+def _read_span(f, start, end):
+    position = start
+    while position < end:
+        f.seek(position)
+        batch = pickle.load(f)
+        position = f.tell()
+        for element in batch:
+            yield element
+
+
+def _spill_partitions(iterable, partitions, tempdir):
+    """Spill the elements to *partitions* temporary files by hash."""
+    files = [tempfile.TemporaryFile(dir=tempdir) for i in range(partitions)]
+    buffers = [[] for i in range(partitions)]
+    try:
+        for element in iterable:
+            index = hash(element) % partitions
+            batch = buffers[index]
+            batch.append(element)
+            if len(batch) >= _BATCH_SIZE:
+                pickle.dump(batch, files[index], pickle.HIGHEST_PROTOCOL)
+                del batch[:]
+        for f, batch in zip(files, buffers):
+            if batch:
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+            f.seek(0)
+    except:
+        for f in files:
+            f.close()
+        raise
+    return files
+
+
+def _read_run(f):
+    while True:
+        try:
+            batch = pickle.load(f)
+        except EOFError:
+            return
+        for element in batch:
+            yield element
+
+
+def _decorate(stream, index, key):
+    for position, element in enumerate(stream):
+        yield key(element), index, position, element
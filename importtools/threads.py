@@ -0,0 +1,121 @@
+"""This module contains helpers for overlapping I/O with the import work.
+
+Loaders usually spend most of their time waiting on the network or on a
+database. Reading them ahead on a background thread lets that latency overlap
+with fetching from the other side and with syncing the chunks.
+
+"""
+
+import Queue
+import sys
+import threading
+
+
+__all__ = ['prefetch']
+
+_ITEMS, _ERROR, _END = range(3)
+
+
+def prefetch(iterable, size=1, batch=1):
+    """Iterate over *iterable* on a background thread.
+
+    The thread starts right away and keeps at most *size* batches of *batch*
+    items buffered ahead of the consumer. Batching amortizes the cost of the
+    hand-off between threads when the items are small.
+
+    >>> list(prefetch(xrange(5), size=2, batch=2))
+    [0, 1, 2, 3, 4]
+
+    Exceptions raised while iterating are re-raised in the consumer:
+
+    >>> def failing():
+    ...     yield 1
+    ...     raise ValueError('boom')
+    >>> list(prefetch(failing())) # doctest:+IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ValueError:
+
+    The background thread stops when the returned iterator is closed or
+    garbage collected. If *iterable* is a generator, it is closed on the
+    background thread.
+
+    """
+    size, batch = int(size), int(batch)
+    if size <= 0 or batch <= 0:
+        raise ValueError('Prefetch size and batch must be positive.')
+    return _Prefetcher(iterable, size, batch)
+
+
+class _Prefetcher(object):
+
+    def __init__(self, iterable, size, batch):
+        self._queue = Queue.Queue(size)
+        self._stop = threading.Event()
+        self._items = iter(())
+        self._done = False
+        # The thread must not reference this object, otherwise it could never
+        # be garbage collected while the thread is alive.
+        thread = threading.Thread(
+            target=_fill, args=(iterable, batch, self._queue, self._stop)
+        )
+        thread.daemon = True
+        thread.start()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        for item in self._items:
+            return item
+        if self._done:
+            raise StopIteration
+        kind, value = self._queue.get()
+        if kind == _ITEMS:
+            self._items = iter(value)
+            return next(self._items)
+        self._done = True
+        self.close()
+        if kind == _ERROR:
+            raise value[0], value[1], value[2]
+        raise StopIteration
+
+    __next__ = next
+
+    def close(self):
+        self._stop.set()
+
+    def __del__(self):
+        self.close()
+
+
+def _fill(iterable, batch, queue, stop):
+    iterator = None
+    try:
+        iterator = iter(iterable)
+        items = []
+        for item in iterator:
+            items.append(item)
+            if len(items) >= batch:
+                if not _put(queue, (_ITEMS, items), stop):
+                    return
+                items = []
+        if items and not _put(queue, (_ITEMS, items), stop):
+            return
+        _put(queue, (_END, None), stop)
+    except Exception:
+        _put(queue, (_ERROR, sys.exc_info()), stop)
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+def _put(queue, item, stop):
+    """Put the item in the queue unless the consumer asked to stop."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+        except Queue.Full:
+            continue
+        return True
+    return False